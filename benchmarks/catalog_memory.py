@@ -0,0 +1,160 @@
+"""
+    Memory of the card rows and the catalog indexes, today's layout against
+    the compact one.
+
+        python -m benchmarks.catalog_memory              # synthetic cards
+        python -m benchmarks.catalog_memory --db         # rows of cards_mv
+        python -m benchmarks.catalog_memory --cards 30000
+"""
+from src.core.snapshot import Snapshot, SnapshotCards, write_snapshot
+from src.core.catalog import CardCatalog, LAZY_INDEXES
+from array import array
+import tracemalloc
+import argparse
+import tempfile
+import random
+import time
+import os
+
+
+ARCHETYPES = [f"Archetype {i}" for i in range(500)]
+RACES = ["Dragon", "Spellcaster", "Warrior", "Fiend", "Machine", "Zombie", "Aqua", "Beast", "Continuous", "Quick-Play"]
+TYPES = ["Normal Monster", "Effect Monster", "Fusion Monster", "Link Monster", "Spell Card", "Trap Card", "XYZ Monster"]
+ATTRIBUTES = ["DARK", "LIGHT", "EARTH", "WATER", "FIRE", "WIND", "DIVINE"]
+FRAMETYPES = ["normal", "effect", "fusion", "link", "spell", "trap", "xyz"]
+WORDS = "dark magician blue eyes white dragon destroy special summon from your graveyard hand deck monster card target".split()
+
+
+def synthetic_cards(n: int, seed: int = 1) -> list[dict]:
+    """Rows shaped like cards_mv. Every value is a fresh object, as psycopg returns them."""
+    rng = random.Random(seed)
+    sets = [
+        {"set_name": f"Set {i}", "set_code": f"S{i:03}", "num_of_cards": rng.randint(20, 300), "tcg_date": "2002-03-08", "set_image": None}
+        for i in range(1000)
+    ]
+    cards = []
+    for card_id in rng.sample(range(10_000, 99_999_999), n):
+        cards.append({
+            "card_id": card_id,
+            "name": " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 5))).title() + f" {card_id}",
+            "descr": " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 80))),
+            "pend_descr": None,
+            "monster_descr": None,
+            "attack": rng.choice([None, rng.randint(0, 50) * 100]),
+            "defence": rng.choice([None, rng.randint(0, 50) * 100]),
+            "level": rng.choice([None, rng.randint(1, 12)]),
+            "archetype": "".join(rng.choice([None, *ARCHETYPES]) or "") or None,
+            "attribute": "".join(rng.choice(ATTRIBUTES)),
+            "frametype": "".join(rng.choice(FRAMETYPES)),
+            "race": "".join(rng.choice(RACES)),
+            "type": "".join(rng.choice(TYPES)),
+            "card_sets": [dict(rng.choice(sets)) for _ in range(rng.randint(0, 8))],
+            "linkmarkers": [],
+            "banlists": rng.choice([[], [{"ban_org": "tcg", "ban_type": "Limited"}]]),
+            "images": [{
+                "image_url": f"https://images.example/{card_id}.jpg",
+                "image_url_small": f"https://images.example/small/{card_id}.jpg",
+                "image_url_cropped": f"https://images.example/cropped/{card_id}.jpg"
+            }],
+            "card_prices": [{
+                "amazon_price": rng.random() * 10, "cardmarket_price": rng.random() * 10, "coolstuffinc_price": 0.0,
+                "ebay_price": rng.random() * 10, "tcgplayer_price": rng.random() * 10
+            }]
+        })
+    return cards
+
+
+def database_cards() -> list[dict]:
+    from src.core import db
+    conn, cur = db.db_instance()
+    cur.execute("SELECT * FROM cards_mv;")
+    cards = cur.fetchall()
+    cur.close()
+    conn.close()
+    return cards
+
+
+def measure(build):
+    """(result, bytes allocated by `build` that are still alive, seconds)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size, elapsed
+
+
+def list_layout(catalog: CardCatalog) -> dict:
+    """Copies of the catalog index shapes as they were before: lists of ints."""
+    return {
+        "permutations": {key: list(rows) for key, rows in catalog.permutations.items()},
+        "postings": {col: {value: list(rows) for value, rows in posting.items()} for col, posting in catalog.postings.items()},
+        "trigrams": {gram: list(rows) for gram, rows in catalog.trigram_index.postings.items()}
+    }
+
+
+def array_layout(catalog: CardCatalog) -> dict:
+    return {
+        "permutations": {key: array('I', rows) for key, rows in catalog.permutations.items()},
+        "postings": {col: {value: array('I', rows) for value, rows in posting.items()} for col, posting in catalog.postings.items()},
+        "trigrams": {gram: array('I', rows) for gram, rows in catalog.trigram_index.postings.items()}
+    }
+
+
+def time_filters(catalog: CardCatalog, rounds: int = 200, queries: int = len(RACES) * len(TYPES)) -> float:
+    """Mean seconds of a filtered, sorted first page, cycling through `queries` different filters."""
+    start = time.perf_counter()
+    for i in range(rounds):
+        query = i % queries
+        catalog.query({"race": RACES[query % len(RACES)], "type": TYPES[query % len(TYPES)]}, None, "attack", "desc", True, 64, 0)
+    return (time.perf_counter() - start) / rounds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cards", type=int, default=13_000, help="synthetic cards to generate")
+    parser.add_argument("--db", action="store_true", help="read the rows of cards_mv instead")
+    args = parser.parse_args()
+
+    source = database_cards if args.db else lambda: synthetic_cards(args.cards)
+    cards, rows_size, _ = measure(source)
+    n = len(cards)
+    print(f"cards: {n}\n")
+    print(f"{'layout':<34}{'MiB':>10}{'bytes/card':>12}{'build s':>10}")
+
+    def report(name: str, size: int, elapsed: float | None = None) -> None:
+        seconds = f"{elapsed:>10.2f}" if elapsed is not None else f"{'':>10}"
+        print(f"{name:<34}{size / 2 ** 20:>10.1f}{size / n:>12.0f}{seconds}")
+
+    report("list[dict] rows (today)", rows_size)
+
+    path = os.path.join(tempfile.mkdtemp(), "cards.snapshot")
+    write_snapshot(cards, 0, None, path)
+    snapshot, snapshot_size, elapsed = measure(lambda: SnapshotCards(Snapshot(path)))
+    report("snapshot rows (heap)", snapshot_size, elapsed)
+    report("snapshot rows (shared mapping)", os.path.getsize(path))
+
+    catalog, catalog_size, elapsed = measure(lambda: CardCatalog(cards))
+    report("catalog indexes", catalog_size, elapsed)
+    rows, live = catalog.index_rows()
+    for index in LAZY_INDEXES:
+        built, index_size, elapsed = measure(lambda: catalog.build_index(index, rows, live))
+        catalog.swap_in_index(index, built, rows, live)
+        report(f"  {index} (first use)", index_size, elapsed)
+    _, lists_size, _ = measure(lambda: list_layout(catalog))
+    report("  row lists, int lists (before)", lists_size)
+    _, arrays_size, _ = measure(lambda: array_layout(catalog))
+    report("  row lists, machine arrays", arrays_size)
+
+    print()
+    print(f"filtered page, catalog over list[dict]: {time_filters(catalog) * 1e6:>8.0f} us")
+    snapshot_catalog = CardCatalog(snapshot)
+    # 70 pages of 64 cards read more rows than SNAPSHOT_ROW_CACHE keeps, every card is decoded again
+    print(f"filtered page, catalog over snapshot:   {time_filters(snapshot_catalog) * 1e6:>8.0f} us")
+    print(f"  same 4 pages again (decoded cache):   {time_filters(snapshot_catalog, queries=4) * 1e6:>8.0f} us")
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+    Encode time of card pages: 64 cards, 999 cards and the whole catalog,
+    per JSON engine, next to what FastAPI's own serialization of a
+    returned dict (jsonable_encoder, then JSONResponse) costs.
+
+        python -m benchmarks.encode              # synthetic cards
+        python -m benchmarks.encode --db         # rows of cards_mv
+        python -m benchmarks.encode --cards 30000
+"""
+from benchmarks.catalog_memory import synthetic_cards, database_cards
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from src.core import payload
+import argparse
+import time
+
+
+PAGE_SIZES = (64, 999)
+
+
+def page(cards: list[dict]) -> dict:
+    return {"total": len(cards), "limit": len(cards), "offset": 0, "page": 1, "pages": 1, "results": cards}
+
+
+def engines() -> dict:
+    """name -> function encoding a page to bytes."""
+    found = {
+        "starlette JSONResponse": lambda content: JSONResponse(content).body,
+        "json": payload._encode_json_stdlib
+    }
+    if payload.orjson is not None:
+        found["orjson"] = lambda content: payload.orjson.dumps(
+            content, default=payload._default, option=payload.orjson.OPT_NON_STR_KEYS
+        )
+    if payload.msgspec is not None:
+        found["msgspec"] = payload.msgspec.json.Encoder(enc_hook=payload._default, decimal_format="number").encode
+    # what a route returning the dict instead of a Response would go through
+    found["fastapi jsonable_encoder + json"] = lambda content: JSONResponse(jsonable_encoder(content)).body
+    return found
+
+
+def timed(encode, content, min_seconds: float = 0.5) -> float:
+    """Best mean seconds per call over a few rounds of at least `min_seconds`."""
+    best = float("inf")
+    for _ in range(3):
+        rounds = 0
+        start = time.perf_counter()
+        while True:
+            encode(content)
+            rounds += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_seconds / 3:
+                break
+        best = min(best, elapsed / rounds)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cards", type=int, default=13_000, help="synthetic cards to generate")
+    parser.add_argument("--db", action="store_true", help="read the rows of cards_mv instead")
+    args = parser.parse_args()
+
+    cards: list[dict] = database_cards() if args.db else synthetic_cards(args.cards)
+    pages = {f"{size} cards": page(cards[:size]) for size in PAGE_SIZES if size < len(cards)}
+    pages[f"catalog ({len(cards)})"] = page(cards)
+    print(f"engine in use: {payload.JSON_ENCODER}\n")
+
+    print(f"{'engine':<34}" + "".join(f"{name:>22}" for name in pages))
+    for name, encode in engines().items():
+        cells: list[str] = []
+        for content in pages.values():
+            seconds = timed(encode, content)
+            size = len(encode(content))
+            cells.append(f"{seconds * 1e3:>10.2f} ms {size / seconds / 2 ** 20:>5.0f}MB/s".rjust(22))
+        print(f"{name:<34}" + "".join(cells))
+
+
+if __name__ == "__main__":
+    main()
@@ -99,6 +99,18 @@ CREATE TABLE IF NOT EXISTS trivia_answers (
     FOREIGN KEY (trivia_id) REFERENCES trivias(trivia_id) ON DELETE CASCADE ON UPDATE CASCADE
 );
 
+-- version is bumped whenever cards_mv changes (cards_mv_rebuild), sets_version when card_sets_mv is refreshed
+CREATE TABLE IF NOT EXISTS data_version (
+    data_version_id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (data_version_id),
+    version BIGINT NOT NULL DEFAULT 1,
+    -- transaction that last bumped version, cards_mv_rebuild bumps it once per transaction
+    bumped_by BIGINT,
+    -- card_sets_mv refreshes move their own counter, they leave the cards of the api workers alone
+    sets_version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+INSERT INTO data_version (data_version_id) VALUES (TRUE) ON CONFLICT DO NOTHING;
+
 -- set_cards
 CREATE INDEX IF NOT EXISTS idx_cards_in_sets_card_id ON cards_in_sets(card_id);
 CREATE INDEX IF NOT EXISTS idx_cards_in_sets_set_id ON cards_in_sets(card_set_id);
@@ -1,118 +1,259 @@
 
+-- one row of cards_mv, cards_mv_rebuild copies rows from here
+CREATE OR REPLACE VIEW cards_v AS
+SELECT
+    c.card_id,
+    c.name,
+    c.descr,
+    c.pend_descr,
+    c.monster_descr,
+    c.attack,
+    c.defence,
+    c.level,
+    c.archetype,
+    c.attribute,
+    c.frametype,
+    c.race,
+    c.type,
+
+    -- sets
+    COALESCE(
+        (
+            SELECT jsonb_agg(
+                jsonb_build_object(
+                    'set_name', cs.set_name,
+                    'set_code', cs.set_code,
+                    'num_of_cards', cs.num_of_cards,
+                    'tcg_date', cs.tcg_date,
+                    'set_image', cs.set_image
+                )
+            )
+            FROM 
+                cards_in_sets cis
+            JOIN 
+                card_sets cs ON cs.card_set_id = cis.card_set_id
+            WHERE 
+                cis.card_id = c.card_id
+        ),
+        '[]'::jsonb
+    ) AS card_sets,
+
+    -- linkmarkers
+    COALESCE(
+        (
+            SELECT 
+                jsonb_agg(position)
+            FROM 
+                linkmarkers lm
+            WHERE 
+                lm.card_id = c.card_id
+        ),
+        '[]'::jsonb
+    ) AS linkmarkers,
+
+    -- banlists
+    COALESCE(
+        (
+            SELECT jsonb_agg(
+                jsonb_build_object(
+                    'ban_org', b.ban_org,
+                    'ban_type', b.ban_type
+                )
+            )
+            FROM 
+                banlist b
+            WHERE 
+                b.card_id = c.card_id
+        ),
+        '[]'::jsonb
+    ) AS banlists,
+
+    -- images
+    COALESCE(
+        (
+            SELECT jsonb_agg(
+                jsonb_build_object(
+                    'image_url', ci.image_url,
+                    'image_url_cropped', ci.image_url_cropped,
+                    'image_url_small', ci.image_url_small
+                )
+            )
+            FROM 
+                card_images ci
+            WHERE 
+                ci.card_id = c.card_id
+        ),
+        '[]'::jsonb
+    ) AS images,
+
+    -- prices
+    COALESCE(
+        (
+            SELECT jsonb_agg(
+                jsonb_build_object(
+                    'amazon_price', COALESCE(cp.amazon_price, 0)::float / 100,
+                    'cardmarket_price', COALESCE(cp.cardmarket_price, 0)::float / 100,
+                    'coolstuffinc_price', COALESCE(cp.coolstuffinc_price, 0)::float / 100,
+                    'ebay_price', COALESCE(cp.ebay_price, 0)::float / 100,
+                    'tcgplayer_price', COALESCE(cp.tcgplayer_price, 0)::float / 100
+                )
+            )
+            FROM 
+                card_prices cp
+            WHERE 
+                cp.card_id = c.card_id
+        ),
+        '[]'::jsonb
+    ) AS card_prices
+
+FROM cards c;
+
+
+-- cards_mv used to be a materialized view, it is now a table kept current by the triggers below.
+-- an old card_sets_mv built from it goes with it, it is created again further down
 DO $$
 BEGIN
-IF NOT EXISTS (
+IF EXISTS (
     SELECT 1
     FROM pg_matviews
     WHERE matviewname = 'cards_mv'
 ) THEN
-    CREATE MATERIALIZED VIEW cards_mv AS
-    SELECT
-        c.card_id,
-        c.name,
-        c.descr,
-        c.pend_descr,
-        c.monster_descr,
-        c.attack,
-        c.defence,
-        c.level,
-        c.archetype,
-        c.attribute,
-        c.frametype,
-        c.race,
-        c.type,
-
-        -- sets
-        COALESCE(
-            (
-                SELECT jsonb_agg(
-                    jsonb_build_object(
-                        'set_name', cs.set_name,
-                        'set_code', cs.set_code,
-                        'num_of_cards', cs.num_of_cards,
-                        'tcg_date', cs.tcg_date,
-                        'set_image', cs.set_image
-                    )
-                )
-                FROM 
-                    cards_in_sets cis
-                JOIN 
-                    card_sets cs ON cs.card_set_id = cis.card_set_id
-                WHERE 
-                    cis.card_id = c.card_id
-            ),
-            '[]'::jsonb
-        ) AS card_sets,
-
-        -- linkmarkers
-        COALESCE(
-            (
-                SELECT 
-                    jsonb_agg(position)
-                FROM 
-                    linkmarkers lm
-                WHERE 
-                    lm.card_id = c.card_id
-            ),
-            '[]'::jsonb
-        ) AS linkmarkers,
-
-        -- banlists
-        COALESCE(
-            (
-                SELECT jsonb_agg(
-                    jsonb_build_object(
-                        'ban_org', b.ban_org,
-                        'ban_type', b.ban_type
-                    )
-                )
-                FROM 
-                    banlist b
-                WHERE 
-                    b.card_id = c.card_id
-            ),
-            '[]'::jsonb
-        ) AS banlists,
-
-        -- images
-        COALESCE(
-            (
-                SELECT jsonb_agg(
-                    jsonb_build_object(
-                        'image_url', ci.image_url,
-                        'image_url_cropped', ci.image_url_cropped,
-                        'image_url_small', ci.image_url_small
-                    )
-                )
-                FROM 
-                    card_images ci
-                WHERE 
-                    ci.card_id = c.card_id
-            ),
-            '[]'::jsonb
-        ) AS images,
-
-        -- prices
-        COALESCE(
-            (
-                SELECT jsonb_agg(
-                    jsonb_build_object(
-                        'amazon_price', COALESCE(cp.amazon_price, 0)::float / 100,
-                        'cardmarket_price', COALESCE(cp.cardmarket_price, 0)::float / 100,
-                        'coolstuffinc_price', COALESCE(cp.coolstuffinc_price, 0)::float / 100,
-                        'ebay_price', COALESCE(cp.ebay_price, 0)::float / 100,
-                        'tcgplayer_price', COALESCE(cp.tcgplayer_price, 0)::float / 100
-                    )
-                )
-                FROM 
-                    card_prices cp
-                WHERE 
-                    cp.card_id = c.card_id
-            ),
-            '[]'::jsonb
-        ) AS card_prices
-
-    FROM cards c;
+    DROP MATERIALIZED VIEW cards_mv CASCADE;
+END IF;
+END$$;
+
+CREATE TABLE IF NOT EXISTS cards_mv AS
+SELECT * FROM cards_v;
+
+
+-- rewrites the cards_mv rows of `ids` from cards_v, every row when `ids` is NULL, and announces them.
+-- an upsert rather than delete + insert: two transactions rebuilding the same card
+-- (a price and an image written together) would otherwise both insert it and one
+-- would abort on idx_cards_mv_card_id. only cards that are gone are deleted
+CREATE OR REPLACE FUNCTION cards_mv_rebuild(ids INT[]) RETURNS VOID AS $$
+BEGIN
+    INSERT INTO cards_mv
+    SELECT * FROM cards_v WHERE ids IS NULL OR card_id = ANY(ids)
+    ON CONFLICT (card_id) DO UPDATE SET
+        name = EXCLUDED.name,
+        descr = EXCLUDED.descr,
+        pend_descr = EXCLUDED.pend_descr,
+        monster_descr = EXCLUDED.monster_descr,
+        attack = EXCLUDED.attack,
+        defence = EXCLUDED.defence,
+        level = EXCLUDED.level,
+        archetype = EXCLUDED.archetype,
+        attribute = EXCLUDED.attribute,
+        frametype = EXCLUDED.frametype,
+        race = EXCLUDED.race,
+        type = EXCLUDED.type,
+        card_sets = EXCLUDED.card_sets,
+        linkmarkers = EXCLUDED.linkmarkers,
+        banlists = EXCLUDED.banlists,
+        images = EXCLUDED.images,
+        card_prices = EXCLUDED.card_prices;
+
+    DELETE FROM cards_mv m
+    WHERE (ids IS NULL OR m.card_id = ANY(ids))
+    AND NOT EXISTS (SELECT 1 FROM cards c WHERE c.card_id = m.card_id);
+
+    -- once per transaction, so writes that bypass the api (image uploads, scripts, manual sql)
+    -- move ETags, the response cache and the snapshots along too
+    UPDATE data_version SET version = version + 1, updated_at = NOW(), bumped_by = txid_current()
+    WHERE bumped_by IS DISTINCT FROM txid_current();
+
+    -- the api workers apply the listed cards, a bare 'cards' (every row, or too many ids
+    -- for the 8000 byte payload) makes them reload everything
+    PERFORM pg_notify('data_changed', CASE
+        WHEN ids IS NULL OR cardinality(ids) > 500 THEN 'cards'
+        ELSE 'cards:' || array_to_string(ids, ',')
+    END);
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- statement trigger: every card touched by the statement is rebuilt once
+CREATE OR REPLACE FUNCTION cards_mv_sync() RETURNS TRIGGER AS $$
+DECLARE
+    ids INT[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(DISTINCT card_id) INTO ids FROM new_rows;
+    ELSIF TG_OP = 'UPDATE' THEN
+        SELECT array_agg(DISTINCT card_id) INTO ids FROM (
+            SELECT card_id FROM new_rows UNION SELECT card_id FROM old_rows
+        ) touched;
+    ELSE
+        SELECT array_agg(DISTINCT card_id) INTO ids FROM old_rows;
+    END IF;
+    IF ids IS NOT NULL THEN
+        PERFORM cards_mv_rebuild(ids);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- set details are copied into card_sets of every card printed in the set
+CREATE OR REPLACE FUNCTION cards_mv_sync_sets() RETURNS TRIGGER AS $$
+DECLARE
+    ids INT[];
+BEGIN
+    SELECT array_agg(DISTINCT cis.card_id) INTO ids
+    FROM cards_in_sets cis
+    WHERE cis.card_set_id IN (SELECT card_set_id FROM new_rows);
+    IF ids IS NOT NULL THEN
+        PERFORM cards_mv_rebuild(ids);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- a trigger with transition tables takes a single event, so each table gets three
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+FOREACH t IN ARRAY ARRAY['cards', 'cards_in_sets', 'linkmarkers', 'banlist', 'card_images', 'card_prices'] LOOP
+    EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', t || '_cards_mv_insert', t);
+    EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', t || '_cards_mv_update', t);
+    EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', t || '_cards_mv_delete', t);
+    EXECUTE format(
+        'CREATE TRIGGER %I AFTER INSERT ON %I REFERENCING NEW TABLE AS new_rows '
+        'FOR EACH STATEMENT EXECUTE FUNCTION cards_mv_sync()', t || '_cards_mv_insert', t
+    );
+    EXECUTE format(
+        'CREATE TRIGGER %I AFTER UPDATE ON %I REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows '
+        'FOR EACH STATEMENT EXECUTE FUNCTION cards_mv_sync()', t || '_cards_mv_update', t
+    );
+    EXECUTE format(
+        'CREATE TRIGGER %I AFTER DELETE ON %I REFERENCING OLD TABLE AS old_rows '
+        'FOR EACH STATEMENT EXECUTE FUNCTION cards_mv_sync()', t || '_cards_mv_delete', t
+    );
+END LOOP;
+END$$;
+
+DROP TRIGGER IF EXISTS card_sets_cards_mv_update ON card_sets;
+CREATE TRIGGER card_sets_cards_mv_update
+AFTER UPDATE ON card_sets
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION cards_mv_sync_sets();
+
+
+-- card_sets_mv used to embed every card as json, it now keeps card ids and copies only
+DO $$
+BEGIN
+IF EXISTS (
+    SELECT 1
+    FROM pg_matviews
+    WHERE matviewname = 'card_sets_mv'
+) AND NOT EXISTS (
+    SELECT 1
+    FROM pg_attribute
+    WHERE attrelid = 'card_sets_mv'::regclass AND attname = 'card_copies'
+) THEN
+    DROP MATERIALIZED VIEW card_sets_mv;
 END IF;
 END$$;
 
@@ -132,23 +273,19 @@ SELECT
     cs.num_of_cards,
     to_char(cs.tcg_date, 'YYYY-MM-DD') as tcg_date,
     cs.set_image,
-    COALESCE(
-        (
-            SELECT json_agg(
-                json_build_object(
-                    'card', to_jsonb(c.*),
-                    'copies', cis.num_of_cards
-                )
-            )
-            FROM 
-                cards_in_sets cis
-            JOIN 
-                cards_mv c ON c.card_id = cis.card_id
-            WHERE 
-                cis.card_set_id = cs.card_set_id
-        ),
-        '[]'::json
-    ) AS cards
+    -- card bodies are read from cards_mv or the in-memory catalog, one page at a time
+    ARRAY(
+        SELECT cis.card_id
+        FROM cards_in_sets cis
+        WHERE cis.card_set_id = cs.card_set_id
+        ORDER BY cis.card_id
+    ) AS card_ids,
+    ARRAY(
+        SELECT cis.num_of_cards
+        FROM cards_in_sets cis
+        WHERE cis.card_set_id = cs.card_set_id
+        ORDER BY cis.card_id
+    ) AS card_copies
 FROM card_sets cs
 WITH DATA;
 END IF;
@@ -161,6 +298,11 @@ CREATE INDEX IF NOT EXISTS idx_cards_mv_name ON cards_mv(name);
 
 CREATE INDEX IF NOT EXISTS idx_cards_mv_name_trgm ON cards_mv USING gin (name gin_trgm_ops);
 
+-- must match util.CARD_TEXT_VECTOR, which every text search of the api goes through
+CREATE INDEX IF NOT EXISTS idx_cards_mv_text ON cards_mv USING gin (
+    (to_tsvector('english', COALESCE(descr, '') || ' ' || COALESCE(pend_descr, '') || ' ' || COALESCE(monster_descr, '')))
+);
+
 CREATE INDEX IF NOT EXISTS idx_cards_mv_attack ON cards_mv(attack DESC);
 
 CREATE INDEX IF NOT EXISTS idx_cards_mv_defence ON cards_mv(defence DESC);
@@ -191,7 +333,3 @@ CREATE INDEX IF NOT EXISTS idx_card_sets_mv_name ON card_sets_mv (set_name);
 CREATE INDEX IF NOT EXISTS idx_card_sets_mv_code ON card_sets_mv (set_code);
 
 CREATE INDEX IF NOT EXISTS idx_card_sets_mv_name_trgm ON card_sets_mv USING gin (set_name gin_trgm_ops);
-
-
-REFRESH MATERIALIZED VIEW CONCURRENTLY cards_mv;
-REFRESH MATERIALIZED VIEW CONCURRENTLY card_sets_mv;
\ No newline at end of file
@@ -1,45 +1,162 @@
-from contextlib import asynccontextmanager
-from src.globals import globals_init
+import time
+# read before the other imports so loading them shows up in the startup timings
+STARTUP_START = time.perf_counter()
+
+from contextlib import asynccontextmanager, contextmanager
+from src.globals import globals_init, globals_get_cards, globals_get_data_tag, globals_get_last_modified
+from src.services.cards_service import get_all_cards_payload
 from fastapi import FastAPI, status, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import Response
+from src.core.payload import FastJSONResponse
 from fastapi import status
 from src.routers import trivias
 from src.routers import cards
 from src.routers import enums
 from src.routers import sets
+from src.routers import decks
+from src.routers import cache
+from src.core.limits import BodySizeLimit
+from src.core import validators
+from src.core import refresh
 from src.core import db
+import asyncio
+import os
 
 
 MAX_BODY_SIZE = 2 * 1024 * 1024
+# eager: the worker accepts requests once everything is loaded.
+# deferred: it starts listening right away, loads in the background and answers 503 until /ready does not
+STARTUP_MODE = os.getenv("STARTUP_MODE", "eager")
+# answered while a deferred worker is still loading
+ALWAYS_SERVED_PATHS = {"/", "/ready"}
+
+STARTUP_TIMINGS: dict[str, float] = {}
+READY = False
+
+
+@contextmanager
+def startup_phase(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STARTUP_TIMINGS[name] = round((time.perf_counter() - start) * 1000, 1)
+
+
+def warm_up() -> None:
+    """The blocking part of startup: migrations, enums, the card snapshot and the all cards payload."""
+    with startup_phase("migrate"):
+        db.db_migrate()
+    with startup_phase("globals"):
+        globals_init()
+    with startup_phase("all_cards_payload"):
+        get_all_cards_payload(globals_get_cards())
+
+
+def mark_ready() -> None:
+    global READY
+    READY = True
+    STARTUP_TIMINGS["total"] = round((time.perf_counter() - STARTUP_START) * 1000, 1)
+    print(f"[STARTUP READY] {STARTUP_MODE} | " + " | ".join(f"{name}: {ms} ms" for name, ms in STARTUP_TIMINGS.items()))
+
+
+async def warm_up_in_background() -> None:
+    try:
+        await asyncio.to_thread(warm_up)
+    except Exception as e:
+        # /ready keeps answering 503 so the orchestrator replaces the worker
+        print(f"[EXCEPTION warm_up_in_background] | {e}")
+        return
+    mark_ready()
+    await refresh.watch_changes()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    global READY
     print("[FASTAPI START]")
-    db.db_migrate()
-    globals_init()
+    STARTUP_TIMINGS.clear()
+    STARTUP_TIMINGS["imports"] = round((time.perf_counter() - STARTUP_START) * 1000, 1)
+    READY = False
+    if STARTUP_MODE == "deferred":
+        with startup_phase("pool"):
+            await db.db_pool_open()
+        task = asyncio.create_task(warm_up_in_background())
+    else:
+        warm_up()
+        with startup_phase("pool"):
+            await db.db_pool_open()
+        mark_ready()
+        task = asyncio.create_task(refresh.watch_changes())
     yield
+    task.cancel()
+    READY = False
+    await refresh.flush_view_refresh()
+    await db.db_pool_close()
     print("[FASTAPI CLOSE]")
 
 
-app = FastAPI(title="Yu-Gi-Oh! API", lifespan=lifespan)
+app = FastAPI(title="Yu-Gi-Oh! API", lifespan=lifespan, default_response_class=FastJSONResponse)
 app.include_router(cards.router, prefix="/cards", tags=["cards"])
 app.include_router(enums.router, prefix="/enums", tags=["enums"])
 app.include_router(sets.router, prefix="/sets", tags=["sets"])
 app.include_router(trivias.router, prefix="/trivias", tags=["trivias"])
+app.include_router(decks.router, prefix="/decks", tags=["decks"])
+app.include_router(cache.router, prefix="/cache", tags=["cache"])
 
 
+app.add_middleware(BodySizeLimit, max_body_size=MAX_BODY_SIZE)
+
+
+# registered after BodySizeLimit so it runs first and a 304 skips everything else
+@app.middleware("http")
+async def conditional_get(request: Request, call_next):
+    path, query = request.url.path, request.url.query
+    data_tag: str = globals_get_data_tag()
+    if not data_tag or not validators.is_versioned(request.method, path, query):
+        return await call_next(request)
+
+    etag: str = validators.version_etag(data_tag, path, query)
+    headers = {"ETag": etag}
+    last_modified = globals_get_last_modified()
+    if last_modified is not None:
+        headers["Last-Modified"] = validators.http_date(last_modified)
+
+    if_none_match: str | None = request.headers.get("if-none-match")
+    if validators.etag_matches(if_none_match, etag) or (
+        if_none_match is None
+        and validators.not_modified_since(request.headers.get("if-modified-since"), last_modified)
+    ):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    response = await call_next(request)
+    # responses with validators of their own (all_cards) keep them
+    if response.status_code == status.HTTP_200_OK and "etag" not in response.headers:
+        response.headers.update(headers)
+    return response
+
+
+# registered last so a worker that is still loading turns requests away before anything else runs
 @app.middleware("http")
-async def limit_body_size(request: Request, call_next):
-    body = await request.body()
-    if len(body) > MAX_BODY_SIZE:
-        return JSONResponse(
-            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            content={"detail": f"Request body too large. Max {MAX_BODY_SIZE} bytes."}
-        )
-    return await call_next(request)
+async def wait_until_ready(request: Request, call_next):
+    if READY or request.url.path in ALWAYS_SERVED_PATHS:
+        return await call_next(request)
+    return FastJSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Starting up, retry shortly."},
+        headers={"Retry-After": "1"}
+    )
 
 
 @app.get("/")
 async def home():
     return status.HTTP_200_OK
+
+
+@app.get("/ready")
+async def ready():
+    """200 once the card snapshot and the all cards payload are loaded, with the startup timings in ms."""
+    return FastJSONResponse(
+        status_code=status.HTTP_200_OK if READY else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"ready": READY, "mode": STARTUP_MODE, "startup_ms": STARTUP_TIMINGS}
+    )
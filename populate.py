@@ -4,6 +4,7 @@ from threading import Lock
 from pathlib import Path
 from src.s3 import YgoS3
 from src import util
+from src.core import snapshot
 from src.core import db
 import json
 
@@ -511,6 +512,12 @@ def main() -> None:
     populate_banlist()
     populate_trivias()
     populate_images()
+    # the migration does not refresh views, card_sets_mv is brought up to date here
+    db.db_refresh_cards_sets_materialized_view(conn, cur)
+    version: dict = db.db_get_data_version(cur)
+    # the api workers map this file at boot instead of each reading cards_mv
+    cur.execute("SELECT * FROM cards_mv;")
+    snapshot.write_snapshot(cur.fetchall(), version['version'], version['updated_at'])
     db.db_size(cur)
     for i in db.db_archetype_rank(cur):
         print(i)
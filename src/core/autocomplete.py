@@ -0,0 +1,128 @@
+from bisect import bisect_left, bisect_right
+import heapq
+import re
+
+
+WORD_START = re.compile(r"(?:^|(?<=[\s\-/\"(]))\w", re.UNICODE)
+# what a word follows in WORD_START, for the LIKE patterns of the database fallback
+WORD_SEPARATORS = (" ", "-", "/", '"', "(")
+MAX_SUGGESTIONS = 25
+# prefixes up to this length have their suggestions precomputed
+PRECOMPUTED_PREFIX = 2
+
+
+def word_keys(name: str) -> list[tuple[str, bool]]:
+    """The suffixes of `name` starting at each word, flagged when it is the whole name."""
+    lowered = name.lower()
+    return [(lowered[match.start():], match.start() == 0) for match in WORD_START.finditer(lowered)]
+
+
+class PrefixIndex:
+    """
+        Sorted prefix array over card names for typeahead.
+
+        Every name is indexed from its start and from the start of each of
+        its words, so `mag` finds "Dark Magician". Suggestions rank names
+        starting with the prefix first, then cards printed in more sets,
+        then shorter names.
+    """
+
+    def __init__(self, names: list[str], card_ids: list[int], printings: list[int]):
+        self.names: list[str] = []
+        self.card_ids: list[int] = []
+        self.scores: list[tuple] = []
+        entries: list[tuple[str, int, bool]] = []
+        for row, name in enumerate(names):
+            self._append(name, card_ids[row], printings[row])
+            entries.extend((key, row, start) for key, start in word_keys(self.names[row]))
+        entries.sort()
+        self.keys: list[str] = [key for key, _, _ in entries]
+        self.rows: list[int] = [row for _, row, _ in entries]
+        self.starts: list[bool] = [start for _, _, start in entries]
+
+        self.top: dict[str, list[int]] = {}
+        # prefixes whose top lost a row, searched again on their next query
+        self.stale: set[str] = set()
+        prefixes = {key[:size] for key in self.keys for size in range(1, min(PRECOMPUTED_PREFIX, len(key)) + 1)}
+        for prefix in prefixes:
+            self.top[prefix] = self._search(prefix, MAX_SUGGESTIONS)
+
+    def _append(self, name: str | None, card_id: int, printings: int) -> int:
+        name = name or ''
+        self.names.append(name)
+        self.card_ids.append(card_id)
+        self.scores.append((-printings, len(name), name.lower(), card_id))
+        return len(self.names) - 1
+
+    def _rank(self, row: int, prefix: str) -> tuple:
+        """Sort key of `row` in the suggestions of `prefix`, as _search orders them."""
+        score = self.scores[row]
+        return (not score[2].startswith(prefix), score)
+
+    def _top_prefixes(self, row: int) -> set[str]:
+        return {
+            key[:size] for key, _ in word_keys(self.names[row])
+            for size in range(1, min(PRECOMPUTED_PREFIX, len(key)) + 1)
+        }
+
+    def add(self, name: str | None, card_id: int, printings: int) -> int:
+        """Indexes one more name, returns its row."""
+        row = self._append(name, card_id, printings)
+        keys = word_keys(self.names[row])
+        for key, start in keys:
+            # the new row is the largest, so it goes after the entries with the same key
+            i = bisect_right(self.keys, key)
+            self.keys.insert(i, key)
+            self.rows.insert(i, row)
+            self.starts.insert(i, start)
+        for prefix in self._top_prefixes(row):
+            if prefix in self.stale:
+                continue
+            top = self.top.setdefault(prefix, [])
+            rank = self._rank(row, prefix)
+            if len(top) < MAX_SUGGESTIONS or rank < self._rank(top[-1], prefix):
+                ranks = [self._rank(other, prefix) for other in top]
+                top.insert(bisect_left(ranks, rank), row)
+                del top[MAX_SUGGESTIONS:]
+        return row
+
+    def remove(self, row: int) -> None:
+        keys = word_keys(self.names[row])
+        for key, _ in keys:
+            i = bisect_left(self.keys, key)
+            while i < len(self.keys) and self.keys[i] == key:
+                if self.rows[i] == row:
+                    del self.keys[i], self.rows[i], self.starts[i]
+                    break
+                i += 1
+        for prefix in self._top_prefixes(row):
+            top = self.top.get(prefix)
+            if top is not None and row in top:
+                # the next best row is unknown until the prefix is searched again
+                del self.top[prefix]
+                self.stale.add(prefix)
+
+    def _search(self, prefix: str, limit: int) -> list[int]:
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix + '\U0010ffff', lo)
+        best: dict[int, bool] = {}
+        for i in range(lo, hi):
+            row = self.rows[i]
+            best[row] = best.get(row, False) or self.starts[i]
+        scores = self.scores
+        return heapq.nsmallest(limit, best, key=lambda row: (not best[row], scores[row]))
+
+    def suggest(self, prefix: str, limit: int = 10) -> list[dict]:
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+        limit = min(limit, MAX_SUGGESTIONS)
+        rows = None
+        if len(prefix) <= PRECOMPUTED_PREFIX:
+            if prefix in self.stale:
+                self.top[prefix] = self._search(prefix, MAX_SUGGESTIONS)
+                self.stale.discard(prefix)
+            rows = self.top.get(prefix)
+        if rows is None:
+            rows = self._search(prefix, limit)
+        return [{"card_id": self.card_ids[row], "name": self.names[row]} for row in rows[:limit]]
@@ -0,0 +1,110 @@
+from typing import Awaitable, Callable
+from collections import OrderedDict
+from fastapi.responses import Response
+from src import globals
+import time
+import os
+
+
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+# rough per entry cost of the key, the tuple and the dict slot
+ENTRY_OVERHEAD = 256
+
+
+class ResponseCache:
+    """
+        Encoded response bodies keyed by normalized query parameters.
+        Bounded by total bytes with LRU eviction, entries expire after a TTL
+        and the whole cache is dropped when the data version changes.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # key -> (expires at, status code, media type, body)
+        self.entries: OrderedDict[tuple, tuple[float, int, str, bytes]] = OrderedDict()
+        self.size = 0
+        self.version: tuple | None = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _sync_version(self) -> None:
+        version = (globals.globals_get_data_version(), globals.globals_get_data_tag())
+        if version != self.version:
+            if self.entries:
+                self.invalidations += 1
+            self.entries.clear()
+            self.size = 0
+            self.version = version
+
+    def _drop(self, key: tuple) -> None:
+        _, _, _, body = self.entries.pop(key)
+        self.size -= len(body) + ENTRY_OVERHEAD
+
+    def get(self, key: tuple) -> Response | None:
+        self._sync_version()
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] < time.monotonic():
+            self._drop(key)
+            self.expirations += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        _, status_code, media_type, body = entry
+        return Response(body, status_code, media_type=media_type)
+
+    def set(self, key: tuple, response: Response, version: tuple | None = None) -> None:
+        """`version` is the one the response was built against, stale builds are not stored."""
+        self._sync_version()
+        if version is not None and version != self.version:
+            return
+        cost = len(response.body) + ENTRY_OVERHEAD
+        if cost > self.max_bytes:
+            return
+        if key in self.entries:
+            self._drop(key)
+        while self.size + cost > self.max_bytes:
+            self._drop(next(iter(self.entries)))
+            self.evictions += 1
+        self.entries[key] = (time.monotonic() + self.ttl, response.status_code, response.media_type, response.body)
+        self.size += cost
+
+    def stats(self) -> dict:
+        self._sync_version()
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations
+        }
+
+
+RESPONSE_CACHE = ResponseCache(RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_TTL)
+
+
+async def cached_response(key: tuple | None, build: Callable[[], Awaitable[Response]]) -> Response:
+    """Serves `key` from RESPONSE_CACHE, or builds the response and stores it when it is a 200 with a body."""
+    if key is None:
+        return await build()
+    response = RESPONSE_CACHE.get(key)
+    if response is not None:
+        return response
+    version: tuple | None = RESPONSE_CACHE.version
+    response = await build()
+    if response.status_code == 200 and isinstance(getattr(response, "body", None), bytes):
+        RESPONSE_CACHE.set(key, response, version)
+    return response
@@ -0,0 +1,473 @@
+from collections.abc import Mapping, Sequence
+from typing import Iterator
+from src.core.autocomplete import PrefixIndex
+from src.core.fulltext import TextIndex
+from src.core.deck import DeckColumns
+from src.core.trigram import TrigramIndex, trigrams, similarity
+from src.core.sampling import sample_page
+from src.core.columns import IntColumn, EnumColumn
+from itertools import islice
+from array import array
+import heapq
+import re
+
+
+SORT_COLUMNS = ("name", "attack", "defence", "level", "card_id")
+FILTER_COLUMNS = ("archetype", "race", "type", "attribute", "frametype")
+INT_COLUMNS = ("attack", "defence", "level", "card_id")
+TEXT_COLUMNS = ("descr", "pend_descr", "monster_descr")
+
+
+def _ilike_matcher(term: str):
+    """Mirrors `name ILIKE '%term%'`, including the `%` and `_` wildcards."""
+    term = term.lower()
+    if '%' not in term and '_' not in term and '\\' not in term:
+        return lambda name: term in name
+    pattern = []
+    escaped = False
+    for ch in term:
+        if escaped:
+            pattern.append(re.escape(ch))
+            escaped = False
+        elif ch == '\\':
+            escaped = True
+        elif ch == '%':
+            pattern.append('.*')
+        elif ch == '_':
+            pattern.append('.')
+        else:
+            pattern.append(re.escape(ch))
+    regex = re.compile(''.join(pattern), re.DOTALL)
+    return lambda name: regex.search(name) is not None
+
+
+def card_text(card: dict) -> str:
+    """Effect text searched by `text=`, the same columns as the cards_mv tsvector index."""
+    return ' '.join(card.get(col) or '' for col in TEXT_COLUMNS)
+
+
+# CardCatalog attributes built on first use instead of with the catalog
+LAZY_INDEXES = ("text_index", "prefix_index")
+
+
+def _index_add(index: str, built: TextIndex | PrefixIndex, card: dict) -> None:
+    if index == "text_index":
+        built.add(card_text(card))
+    else:
+        built.add(card.get('name'), card['card_id'], len(card.get('card_sets') or []))
+
+
+def _index_remove(index: str, built: TextIndex | PrefixIndex, row: int, card: dict) -> None:
+    if index == "text_index":
+        built.remove(row, card_text(card))
+    else:
+        built.remove(row)
+
+
+class CardsById(Mapping):
+    """card_id -> card, read through the catalog rows so no second copy of the cards is kept."""
+
+    def __init__(self, catalog: "CardCatalog"):
+        self.catalog = catalog
+
+    def __getitem__(self, card_id: int) -> dict:
+        return self.catalog.cards[self.catalog.row_of[card_id]]
+
+    def __contains__(self, card_id) -> bool:
+        return card_id in self.catalog.row_of
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.catalog.row_of)
+
+    def __len__(self) -> int:
+        return len(self.catalog.row_of)
+
+
+class LiveCards(Sequence):
+    """The current cards of a catalog in card_id order, decoded as they are read."""
+
+    def __init__(self, catalog: "CardCatalog"):
+        self.cards = catalog.cards
+        self.rows = catalog.live_rows
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, i: int) -> dict:
+        return self.cards[self.rows[i]]
+
+    def __iter__(self) -> Iterator[dict]:
+        # a full scan of a snapshot skips its cache of decoded cards
+        read = getattr(self.cards, "decode", self.cards.__getitem__)
+        return (read(row) for row in self.rows)
+
+
+class CardCatalog:
+    """
+        Columnar view over the rows of cards_mv.
+
+        Answers the filter / sort / paginate combinations of GET /cards
+        without touching the database. Rows are addressed by their position
+        in `cards`, which may be a memory mapped snapshot decoding a card
+        only when it is read. Writes are applied with upsert / remove: a
+        replaced or removed card keeps its position but drops out of every
+        index.
+    """
+
+    def __init__(self, cards: Sequence[dict]):
+        self.cards = cards
+        self.deck_columns = DeckColumns([])
+        # one pass, a snapshot card is decoded, read and dropped, so its cards are never all decoded at once
+        values: dict[str, list] = {col: [] for col in SORT_COLUMNS + FILTER_COLUMNS}
+        for card in cards:
+            for col, column in values.items():
+                column.append(card.get(col))
+            self.deck_columns.add(card)
+        self.size = len(values['card_id'])
+        # ints in machine arrays and enum values as codes, the plain lists above only live during the build
+        self.columns: dict[str, IntColumn | EnumColumn | list] = {
+            col: IntColumn(values[col]) if col in INT_COLUMNS else EnumColumn(values[col]) if col in FILTER_COLUMNS else values[col]
+            for col in values
+        }
+        self.by_id: Mapping[int, dict] = CardsById(self)
+        self.row_of: dict[int, int] = {card_id: row for row, card_id in enumerate(values['card_id'])}
+        # name is citext, so ILIKE and ORDER BY are case insensitive
+        self.names: list[str] = [(name or '').lower() for name in values['name']]
+
+        # posting lists: column -> value -> ascending row positions
+        self.postings: dict[str, dict[str, array]] = {}
+        for col in FILTER_COLUMNS:
+            posting: dict[str, array] = {}
+            for row, value in enumerate(values[col]):
+                if value is not None:
+                    posting.setdefault(value, array('I')).append(row)
+            self.postings[col] = posting
+
+        self.trigram_index = TrigramIndex(self.names)
+        # the largest indexes (~27 and ~7.5 MiB for 13k cards) are built on first use, see build_index
+        self.text_index: TextIndex | None = None
+        self.prefix_index: PrefixIndex | None = None
+
+        # sort permutations: (column, order, null_first) -> row positions
+        self.permutations: dict[tuple[str, str, bool], array] = {}
+        # inverse permutations, built on first use and dropped on every write
+        self.ranks: dict[tuple[str, str, bool], array] = {}
+        by_card_id = sorted(range(self.size), key=values['card_id'].__getitem__)
+        for col in SORT_COLUMNS:
+            column = self.names if col == 'name' else values[col]
+            nulls = [row for row in by_card_id if column[row] is None]
+            not_nulls = [row for row in by_card_id if column[row] is not None]
+            for order in ("asc", "desc"):
+                # sorted() is stable, so ties keep the `card_id ASC` tiebreaker
+                ordered = sorted(not_nulls, key=column.__getitem__, reverse=order == "desc")
+                for null_first in (True, False):
+                    self.permutations[(col, order, null_first)] = array('I', nulls + ordered if null_first else ordered + nulls)
+
+    def index_rows(self) -> tuple[int, set[int]]:
+        """The rows there are and the live ones among them, taken on the event loop before build_index."""
+        return len(self.cards), set(self.row_of.values())
+
+    def build_index(self, index: str, rows: int, live: set[int]) -> TextIndex | PrefixIndex:
+        """
+            Builds one of LAZY_INDEXES over the first `rows` rows, runs in a
+            thread. Rows that are not `live` get a placeholder, so positions
+            still line up with `cards`.
+        """
+        read = getattr(self.cards, "decode", self.cards.__getitem__)
+        # generators, one card decoded at a time
+        cards = (read(row) if row in live else {} for row in range(rows))
+        if index == "text_index":
+            built = TextIndex(card_text(card) for card in cards)
+            for row in range(rows):
+                if row not in live:
+                    # the placeholder has no terms, this only takes it out of the BM25 statistics
+                    built.remove(row, "")
+            return built
+        names: list[str | None] = []
+        card_ids: list[int | None] = []
+        printings: list[int] = []
+        for card in cards:
+            names.append(card.get('name'))
+            card_ids.append(card.get('card_id'))
+            printings.append(len(card.get('card_sets') or []))
+        return PrefixIndex(names, card_ids, printings)
+
+    def ensure_index(self, index: str) -> TextIndex | PrefixIndex:
+        """Builds `index` right here when nobody built it in a thread first."""
+        if getattr(self, index) is None:
+            rows, live = self.index_rows()
+            self.swap_in_index(index, self.build_index(index, rows, live), rows, live)
+        return getattr(self, index)
+
+    def swap_in_index(self, index: str, built: TextIndex | PrefixIndex, rows: int, live: set[int]) -> None:
+        """Applies the writes made while `built` was built, then swaps it in. Runs on the event loop."""
+        live_now: set[int] = set(self.row_of.values())
+        for row in range(rows, len(self.cards)):
+            _index_add(index, built, self.cards[row])
+            if row not in live_now:
+                _index_remove(index, built, row, self.cards[row])
+        for row in live - live_now:
+            _index_remove(index, built, row, self.cards[row])
+        setattr(self, index, built)
+
+    @property
+    def live_rows(self) -> array:
+        """Positions of the current cards, in card_id order."""
+        return self.permutations[("card_id", "asc", False)]
+
+    def _rank(self, key: tuple[str, str, bool]) -> array:
+        rank = self.ranks.get(key)
+        if rank is None:
+            rank = array('I', bytes(4 * len(self.cards)))
+            for position, row in enumerate(self.permutations[key]):
+                rank[row] = position
+            self.ranks[key] = rank
+        return rank
+
+    def upsert(self, card: dict) -> None:
+        """Adds `card`, replacing the card with the same card_id."""
+        card_id = card['card_id']
+        if card_id in self.row_of:
+            self.remove(card_id)
+
+        row = len(self.cards)
+        self.cards.append(card)
+        for col in SORT_COLUMNS + FILTER_COLUMNS:
+            self.columns[col].append(card.get(col))
+        self.names.append((card.get('name') or '').lower())
+        self.row_of[card_id] = row
+        for col in FILTER_COLUMNS:
+            value = card.get(col)
+            if value is not None:
+                # the new row is the largest, so the posting list stays sorted
+                self.postings[col].setdefault(value, array('I')).append(row)
+
+        self.trigram_index.add(self.names[row])
+        self.deck_columns.add(card)
+        for index in LAZY_INDEXES:
+            if getattr(self, index) is not None:
+                _index_add(index, getattr(self, index), card)
+
+        for key, permutation in self.permutations.items():
+            position = self.seek(key, (self.columns[key[0]][row], card_id))
+            # copy on write, so iterators over the old permutation are left alone
+            self.permutations[key] = permutation[:position] + array('I', [row]) + permutation[position:]
+        self.ranks.clear()
+        self.size += 1
+
+    def remove(self, card_id: int) -> bool:
+        """Drops the card with `card_id`, returns False when there is none."""
+        row = self.row_of.get(card_id)
+        if row is None:
+            return False
+
+        for key, permutation in self.permutations.items():
+            # seek lands right after the row being removed
+            position = self.seek(key, (self.columns[key[0]][row], card_id)) - 1
+            if position < 0 or permutation[position] != row:
+                position = permutation.index(row)
+            self.permutations[key] = permutation[:position] + permutation[position + 1:]
+        self.ranks.clear()
+
+        card = self.cards[row]
+        del self.row_of[card_id]
+        for col in FILTER_COLUMNS:
+            value = self.columns[col][row]
+            if value is not None:
+                self.postings[col][value].remove(row)
+        self.trigram_index.remove(row, self.names[row])
+        self.deck_columns.remove(card_id)
+        for index in LAZY_INDEXES:
+            if getattr(self, index) is not None:
+                _index_remove(index, getattr(self, index), row, card)
+        self.size -= 1
+        return True
+
+    def select(
+        self,
+        filters: dict[str, str],
+        search: str | None,
+        text: str | None = None
+    ) -> set[int] | None:
+        """Returns the matching row positions, or None when every row matches."""
+        selected: set[int] | None = None
+        postings = sorted(
+            (self.postings[col].get(value, []) for col, value in filters.items()),
+            key=len
+        )
+        for posting in postings:
+            if selected is None:
+                selected = set(posting)
+            else:
+                selected.intersection_update(posting)
+            if not selected:
+                return selected
+
+        if search:
+            match = _ilike_matcher(search)
+            names = self.names
+            rows = self.live_rows if selected is None else selected
+            selected = {row for row in rows if match(names[row])}
+
+        if text:
+            selected = set(self.ensure_index("text_index").scores(text, selected))
+
+        return selected
+
+    def seek(self, key: tuple[str, str, bool], after: tuple) -> int:
+        """Position in the `key` permutation of the first row after the (value, card_id) cursor."""
+        col, order, null_first = key
+        values = self.names if col == 'name' else self.columns[col]
+        card_ids = self.columns['card_id']
+        last_value, last_id = after
+        if col == 'name' and last_value is not None:
+            last_value = last_value.lower()
+
+        def is_after(row: int) -> bool:
+            value = values[row]
+            if value is None or last_value is None:
+                if value is None and last_value is None:
+                    return card_ids[row] > last_id
+                return value is not None if null_first else value is None
+            if value != last_value:
+                return value > last_value if order == "asc" else value < last_value
+            return card_ids[row] > last_id
+
+        permutation = self.permutations[key]
+        lo, hi = 0, len(permutation)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if is_after(permutation[mid]):
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def _ordered(
+        self,
+        selected: set[int] | None,
+        key: tuple[str, str, bool],
+        start: int = 0
+    ) -> Iterator[int]:
+        permutation = self.permutations[key]
+        if selected is None:
+            return (permutation[i] for i in range(start, len(permutation)))
+        if len(selected) * 8 < self.size:
+            rank = self._rank(key)
+            return (row for row in sorted(selected, key=rank.__getitem__) if rank[row] >= start)
+        return (permutation[i] for i in range(start, len(permutation)) if permutation[i] in selected)
+
+    def iter_rows(
+        self,
+        filters: dict[str, str],
+        search: str | None,
+        sort_by: str,
+        sort_order: str,
+        null_first: bool,
+        text: str | None = None
+    ) -> Iterator[dict]:
+        selected = self.select(filters, search, text)
+        for row in self._ordered(selected, (sort_by, sort_order, null_first)):
+            yield self.cards[row]
+
+    def query(
+        self,
+        filters: dict[str, str],
+        search: str | None,
+        sort_by: str,
+        sort_order: str,
+        null_first: bool,
+        limit: int,
+        offset: int,
+        after: tuple | None = None,
+        text: str | None = None
+    ) -> tuple[int, list[dict]]:
+        """`after` is a (sort value, card_id) cursor and takes the place of `offset`."""
+        key = (sort_by, sort_order, null_first)
+        selected = self.select(filters, search, text)
+        start = 0
+        if after is not None:
+            start, offset = self.seek(key, after), 0
+
+        if selected is None:
+            rows = self.permutations[key][start + offset:start + offset + limit]
+            return self.size, [self.cards[row] for row in rows]
+
+        total = len(selected)
+        if offset >= total:
+            return total, []
+
+        rows = islice(self._ordered(selected, key, start), offset, offset + limit)
+        return total, [self.cards[row] for row in rows]
+
+    def sample(
+        self,
+        filters: dict[str, str],
+        search: str | None,
+        limit: int,
+        offset: int,
+        seed: int | None = None,
+        text: str | None = None
+    ) -> tuple[int, list[dict]]:
+        """Random page of the matching cards, see sample_page."""
+        selected = self.select(filters, search, text)
+        # seeded shuffles start from card_id order so they don't depend on row positions
+        by_card_id = self.live_rows
+        if selected is None:
+            total = self.size
+            population = by_card_id
+        else:
+            total = len(selected)
+            population = list(selected) if seed is None else [row for row in by_card_id if row in selected]
+        rows = sample_page(population, limit, offset, seed)
+        return total, [self.cards[row] for row in rows]
+
+    def rank(
+        self,
+        filters: dict[str, str],
+        search: str,
+        min_similarity: float,
+        limit: int,
+        offset: int
+    ) -> tuple[int, list[dict]]:
+        """
+            Cards whose name is trigram-similar to `search` or contains it,
+            best match first (similarity DESC, name, card_id).
+        """
+        selected = self.select(filters, None)
+        scores = self.trigram_index.scores(search, min_similarity, selected)
+
+        # substring matches stay in the results even when they score below the threshold
+        query = trigrams(search)
+        match = _ilike_matcher(search)
+        names = self.names
+        for row in self.live_rows if selected is None else selected:
+            if row not in scores and match(names[row]):
+                scores[row] = similarity(query, trigrams(names[row]))
+
+        card_ids = self.columns['card_id']
+        top = heapq.nsmallest(
+            offset + limit,
+            scores,
+            key=lambda row: (-scores[row], names[row], card_ids[row])
+        )
+        return len(scores), [self.cards[row] for row in top[offset:]]
+
+    def rank_text(
+        self,
+        filters: dict[str, str],
+        search: str | None,
+        text: str,
+        limit: int,
+        offset: int
+    ) -> tuple[int, list[dict]]:
+        """Cards whose text matches `text`, best BM25 score first (then name, card_id)."""
+        scores = self.ensure_index("text_index").scores(text, self.select(filters, search))
+        names = self.names
+        card_ids = self.columns['card_id']
+        top = heapq.nsmallest(
+            offset + limit,
+            scores,
+            key=lambda row: (-scores[row], names[row], card_ids[row])
+        )
+        return len(scores), [self.cards[row] for row in top[offset:]]
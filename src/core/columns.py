@@ -0,0 +1,45 @@
+from array import array
+import sys
+
+
+# stands for NULL in the int columns
+NULL_INT = -(2 ** 63)
+
+
+class IntColumn:
+    """Nullable ints in one machine array."""
+
+    def __init__(self, values: list[int | None]):
+        self.data = array('q', (NULL_INT if value is None else value for value in values))
+
+    def __getitem__(self, row: int) -> int | None:
+        value = self.data[row]
+        return None if value == NULL_INT else value
+
+    def append(self, value: int | None) -> None:
+        self.data.append(NULL_INT if value is None else value)
+
+
+class EnumColumn:
+    """Low cardinality strings, stored as 2 byte codes into one shared vocabulary. Code 0 is NULL."""
+
+    def __init__(self, values: list[str | None]):
+        self.vocabulary: list[str | None] = [None]
+        self.codes_of: dict[str | None, int] = {None: 0}
+        self.data = array('H')
+        for value in values:
+            self.append(value)
+
+    def code(self, value: str | None) -> int:
+        code = self.codes_of.get(value)
+        if code is None:
+            code = len(self.vocabulary)
+            self.vocabulary.append(sys.intern(value))
+            self.codes_of[value] = code
+        return code
+
+    def __getitem__(self, row: int) -> str | None:
+        return self.vocabulary[self.data[row]]
+
+    def append(self, value: str | None) -> None:
+        self.data.append(self.code(value))
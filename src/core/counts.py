@@ -0,0 +1,99 @@
+from psycopg import AsyncCursor
+from src.core import db
+from src import globals
+
+
+MAX_CACHED_COUNTS = 4096
+
+# (table, where_clause, params) -> total, valid for COUNTS_VERSION only
+COUNTS: dict[tuple, int] = {}
+# (data version, data tag), the tag also moves when card_sets_mv is refreshed
+COUNTS_VERSION: tuple[int, str] | None = None
+
+
+def count_key(table: str, where_clause: str, params: list | tuple) -> tuple:
+    return (table, where_clause, tuple(params))
+
+
+def _sync_version() -> None:
+    global COUNTS, COUNTS_VERSION
+    version: tuple[int, str] = (globals.globals_get_data_version(), globals.globals_get_data_tag())
+    if version != COUNTS_VERSION:
+        COUNTS = {}
+        COUNTS_VERSION = version
+
+
+def get_cached_count(key: tuple) -> int | None:
+    _sync_version()
+    return COUNTS.get(key)
+
+
+def set_cached_count(key: tuple, total: int) -> None:
+    _sync_version()
+    if len(COUNTS) >= MAX_CACHED_COUNTS:
+        # dicts keep insertion order, drop the oldest entry
+        del COUNTS[next(iter(COUNTS))]
+    COUNTS[key] = total
+
+
+async def count_rows(
+    cur: AsyncCursor,
+    table: str,
+    where_clause: str,
+    params: list | tuple,
+    mode: str = "exact"
+) -> int | None:
+    """
+        Total rows of `table` matching `where_clause`.
+        exact counts are cached until the data version changes,
+        estimate asks the planner and none skips the count.
+    """
+    if mode == "none":
+        return None
+    if mode == "estimate":
+        return await db.db_estimate_count(cur, table, where_clause, tuple(params))
+    key = count_key(table, where_clause, params)
+    total: int | None = get_cached_count(key)
+    if total is None:
+        await cur.execute(f"SELECT COUNT(*) AS total FROM {table} {where_clause};", tuple(params))
+        total = (await cur.fetchone())['total']
+        set_cached_count(key, total)
+    return total
+
+
+def pop_window_count(rows: list[dict], column: str = "total_count") -> int | None:
+    """Strips the COUNT(*) OVER() column from a page, returning its value."""
+    total: int | None = None
+    for row in rows:
+        total = row.pop(column)
+    return total
+
+
+def cached_total(key: tuple, mode: str) -> int | None:
+    return get_cached_count(key) if mode == "exact" else None
+
+
+async def resolve_total(
+    cur: AsyncCursor,
+    key: tuple,
+    mode: str,
+    rows: list[dict],
+    windowed: bool,
+    offset: int,
+    total: int | None
+) -> int | None:
+    """
+        Finishes the count of a page query. When the page was fetched with
+        COUNT(*) OVER() the total comes with the rows and no second query runs.
+    """
+    if windowed:
+        total = pop_window_count(rows)
+        if total is None and offset > 0:
+            # past the last page, the window has no row to report on
+            return await count_rows(cur, key[0], key[1], key[2])
+        total = total or 0
+        set_cached_count(key, total)
+        return total
+    if total is not None:
+        return total
+    return await count_rows(cur, key[0], key[1], key[2], mode)
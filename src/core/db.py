@@ -1,4 +1,5 @@
-from psycopg import Connection, Cursor
+from psycopg import Connection, Cursor, AsyncCursor
+from psycopg_pool import AsyncConnectionPool
 from psycopg.rows import dict_row
 from dotenv import load_dotenv
 from pathlib import Path
@@ -6,6 +7,7 @@ from psycopg import sql
 from src.schemas.card import Card
 from src.schemas.rank import Rank
 import psycopg
+import hashlib
 import os
 
 
@@ -20,6 +22,41 @@ DATABASE_CONFIG = {
     "port": os.getenv("DB_PORT")
 }
 
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "600"))
+
+POOL: AsyncConnectionPool | None = None
+# payloads: "cards:<id>,<id>..." or "cards" (reload all) from cards_mv_rebuild, "sets" when
+# card_sets_mv is refreshed, "enums" when an enum value is added
+DATA_CHANGED_CHANNEL = "data_changed"
+
+
+async def db_pool_open() -> None:
+    global POOL
+    POOL = AsyncConnectionPool(
+        conninfo="",
+        kwargs={**DATABASE_CONFIG, "row_factory": dict_row},
+        min_size=DB_POOL_MIN_SIZE,
+        max_size=DB_POOL_MAX_SIZE,
+        timeout=DB_POOL_TIMEOUT,
+        max_idle=DB_POOL_MAX_IDLE,
+        # connections are checked before being handed out, broken ones are replaced
+        check=AsyncConnectionPool.check_connection,
+        open=False
+    )
+    await POOL.open(wait=True)
+    print(f"[DATABASE POOL OPEN] min: {DB_POOL_MIN_SIZE} max: {DB_POOL_MAX_SIZE}")
+
+
+async def db_pool_close() -> None:
+    global POOL
+    if POOL is not None:
+        await POOL.close()
+        POOL = None
+        print("[DATABASE POOL CLOSE]")
+
 
 def db_instance() -> tuple[Connection, Cursor]:
     conn = psycopg.connect(**DATABASE_CONFIG, row_factory=dict_row)
@@ -27,12 +64,9 @@ def db_instance() -> tuple[Connection, Cursor]:
     return conn, cursor
 
 
-def get_db():
-    conn = psycopg.connect(**DATABASE_CONFIG, row_factory=dict_row)
-    try:
+async def get_db():
+    async with POOL.connection() as conn:
         yield conn
-    finally:
-        conn.close()
 
 
 def db_count(cur: Cursor, table: str) -> int:
@@ -40,6 +74,17 @@ def db_count(cur: Cursor, table: str) -> int:
     return cur.fetchone()['total']
 
 
+# applied in this order, each file is idempotent and is run again only when its contents change
+MIGRATIONS: tuple[Path, ...] = (
+    Path("db/extensions.sql"),
+    Path("db/enums.sql"),
+    Path("db/tables.sql"),
+    Path("db/views.sql")
+)
+# pg_advisory_lock key held while migrating, the other workers wait on it and then find nothing to do
+MIGRATION_LOCK_ID = 7_420_011
+
+
 def db_execute_sql_file(file: Path, conn: Connection, cursor: Cursor) -> None:
     try:
         with open(file, "r", encoding="utf-8") as f:
@@ -49,17 +94,60 @@ def db_execute_sql_file(file: Path, conn: Connection, cursor: Cursor) -> None:
     except Exception as e:
         print(f"exception when open commands [{file}]", e)
 
-        
+
+def db_applied_migrations(cur: Cursor) -> dict[str, str]:
+    cur.execute(
+        """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                name TEXT PRIMARY KEY,
+                checksum TEXT NOT NULL,
+                applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            );
+        """
+    )
+    cur.execute("SELECT name, checksum FROM schema_migrations;")
+    return {name: checksum for name, checksum in cur.fetchall()}
+
+
 def db_migrate() -> None:
+    """
+        Runs the files of MIGRATIONS whose checksum differs from the one
+        recorded in schema_migrations. A file and its record are committed
+        together, a failing file stops the run and is retried next boot.
+        Materialized views are not refreshed here.
+    """
     print("[DATABASE MIGRATE START]")
     conn = psycopg.connect(**DATABASE_CONFIG)
     cursor = conn.cursor()
-    db_execute_sql_file(Path("db/extensions.sql"), conn, cursor)
-    db_execute_sql_file(Path("db/enums.sql"), conn, cursor)
-    db_execute_sql_file(Path("db/tables.sql"), conn, cursor)
-    db_execute_sql_file(Path("db/views.sql"), conn, cursor)
-    cursor.close()
-    conn.close()
+    try:
+        cursor.execute("SELECT pg_advisory_lock(%s);", (MIGRATION_LOCK_ID, ))
+        applied: dict[str, str] = db_applied_migrations(cursor)
+        conn.commit()
+        for file in MIGRATIONS:
+            sql_commands: str = file.read_text(encoding="utf-8")
+            checksum: str = hashlib.sha256(sql_commands.encode()).hexdigest()
+            if applied.get(file.name) == checksum:
+                continue
+            try:
+                cursor.execute(sql_commands)
+                cursor.execute(
+                    """
+                        INSERT INTO schema_migrations (name, checksum) VALUES (%s, %s)
+                        ON CONFLICT (name) DO UPDATE SET checksum = EXCLUDED.checksum, applied_at = NOW();
+                    """,
+                    (file.name, checksum)
+                )
+                conn.commit()
+                print(f"[DATABASE MIGRATE APPLY] {file}")
+            except Exception as e:
+                conn.rollback()
+                print(f"[EXCEPTION db_migrate] | {file} | {e}")
+                break
+    finally:
+        conn.rollback()
+        cursor.execute("SELECT pg_advisory_unlock(%s);", (MIGRATION_LOCK_ID, ))
+        cursor.close()
+        conn.close()
     print("[DATABASE MIGRATE END]")
 
 
@@ -80,9 +168,9 @@ def db_size(cur: Cursor) -> None:
     [print(i) for i in cur.fetchall()]
 
     
-def get_card_by_id(cur: Cursor, card_id: int) -> Card:
-    cur.execute("SELECT * FROM cards_mv WHERE card_id = %s;", (card_id, ))
-    return cur.fetchone()
+async def get_card_by_id(cur: AsyncCursor, card_id: int) -> Card:
+    await cur.execute("SELECT * FROM cards_mv WHERE card_id = %s;", (card_id, ))
+    return await cur.fetchone()
 
 
 def db_enum_value_exists(cur: Cursor, enum: str, value: str) -> bool:
@@ -123,6 +211,8 @@ def db_add_enum_value_if_not_exists(conn: Connection, cur: Cursor, enum: str, va
         )
         print(f"[TRY ADD ENUM VALUE] {enum}:{value}")
         cur.execute(query)
+        # delivered on commit, together with the new value
+        cur.execute("SELECT pg_notify(%s, 'enums');", (DATA_CHANGED_CHANNEL, ))
         conn.commit()
         print(f"[NEW ENUM VALUE ADDED] {enum}:{value}")
     except Exception as e:
@@ -187,11 +277,48 @@ def db_count(cur: Cursor, table: str) -> int:
     return 0
 
 
-def db_refresh_cards_materialized_view(conn: Connection, cur: Cursor) -> None:
-    cur.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY cards_mv;")
-    conn.commit()
+def db_get_data_version(cur: Cursor) -> dict:
+    cur.execute("SELECT version, sets_version, updated_at FROM data_version;")
+    return cur.fetchone()
+
+
+def db_bump_sets_version(cur: Cursor) -> dict:
+    """Runs in the caller's transaction. The cards version is bumped by cards_mv_rebuild."""
+    cur.execute(
+        "UPDATE data_version SET sets_version = sets_version + 1, updated_at = NOW() RETURNING version, sets_version, updated_at;"
+    )
+    version: dict = cur.fetchone()
+    cur.execute("SELECT pg_notify(%s, 'sets');", (DATA_CHANGED_CHANNEL, ))
+    return version
+
+
+async def get_data_version(cur: AsyncCursor) -> dict:
+    await cur.execute("SELECT version, sets_version, updated_at FROM data_version;")
+    return await cur.fetchone()
+
+
+async def bump_sets_version(cur: AsyncCursor) -> dict:
+    await cur.execute(
+        "UPDATE data_version SET sets_version = sets_version + 1, updated_at = NOW() RETURNING version, sets_version, updated_at;"
+    )
+    version: dict = await cur.fetchone()
+    await cur.execute("SELECT pg_notify(%s, 'sets');", (DATA_CHANGED_CHANNEL, ))
+    return version
+
+
+async def get_cards_by_ids(cur: AsyncCursor, card_ids: list[int]) -> list[dict]:
+    await cur.execute("SELECT * FROM cards_mv WHERE card_id = ANY(%s);", (card_ids, ))
+    return await cur.fetchall()
 
 
 def db_refresh_cards_sets_materialized_view(conn: Connection, cur: Cursor) -> None:
     cur.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY card_sets_mv;")
-    conn.commit()
\ No newline at end of file
+    db_bump_sets_version(cur)
+    conn.commit()
+
+
+async def db_estimate_count(cur: AsyncCursor, table: str, where_clause: str, params: tuple) -> int:
+    await cur.execute(f"EXPLAIN (FORMAT JSON) SELECT 1 FROM {table} {where_clause};", params)
+    r = await cur.fetchone()
+    plan = r['QUERY PLAN'] if isinstance(r, dict) else r[0]
+    return int(plan[0]['Plan']['Plan Rows'])
@@ -0,0 +1,144 @@
+from collections import Counter
+
+
+BAN_ORGS = ("tcg", "ocg", "goat")
+BAN_LIMITS = {"Forbidden": 0, "Limited": 1, "Semi-Limited": 2}
+MAX_COPIES = 3
+PRICE_VENDORS = ("amazon_price", "cardmarket_price", "coolstuffinc_price", "ebay_price", "tcgplayer_price")
+DECK_SECTIONS = ("main", "extra", "side")
+SECTION_SIZES = {"main": (40, 60), "extra": (0, 15), "side": (0, 15)}
+MAX_DECK_LINES = 1000
+
+
+class InvalidDeck(ValueError):
+    pass
+
+
+def parse_ydk(ydk: str) -> dict[str, list[int]]:
+    """
+        Parses a .ydk deck list. Ids follow a `#main`, `#extra` or `!side`
+        header, other `#` lines are comments.
+    """
+    sections: dict[str, list[int]] = {section: [] for section in DECK_SECTIONS}
+    section = "main"
+    lines = ydk.splitlines()
+    if len(lines) > MAX_DECK_LINES:
+        raise InvalidDeck(f"a deck has at most {MAX_DECK_LINES} lines")
+    for number, line in enumerate(lines, start=1):
+        line = line.strip().lstrip("\ufeff")
+        if not line:
+            continue
+        if line.startswith(("#", "!")):
+            header = line[1:].strip().lower()
+            if header in DECK_SECTIONS:
+                section = header
+            continue
+        # isdigit alone lets through digits int() rejects, like '²'
+        if not (line.isascii() and line.isdigit()):
+            raise InvalidDeck(f"line {number} is not a card id -> {line}")
+        sections[section].append(int(line))
+    return sections
+
+
+class DeckColumns:
+    """
+        The card columns a deck check reads, one list per column indexed by
+        row: ban limit per org, price per vendor, type, attribute and level.
+    """
+
+    def __init__(self, cards: list[dict]):
+        self.rows: dict[int, int] = {}
+        self.names: list[str] = []
+        self.types: list[str | None] = []
+        self.attributes: list[str | None] = []
+        self.levels: list[int | None] = []
+        self.limits: dict[str, list[int]] = {org: [] for org in BAN_ORGS}
+        self.prices: dict[str, list[float]] = {vendor: [] for vendor in PRICE_VENDORS}
+        for card in cards:
+            self.add(card)
+
+    def add(self, card: dict) -> int:
+        """Appends the columns of one card, replacing the row its card_id had."""
+        row = len(self.names)
+        self.rows[card['card_id']] = row
+        self.names.append(card.get('name'))
+        self.types.append(card.get('type'))
+        self.attributes.append(card.get('attribute'))
+        self.levels.append(card.get('level'))
+
+        limits = {org: MAX_COPIES for org in BAN_ORGS}
+        for ban in card.get('banlists') or []:
+            if ban.get('ban_org') in limits:
+                limits[ban['ban_org']] = BAN_LIMITS.get(ban.get('ban_type'), MAX_COPIES)
+        for org, limit in limits.items():
+            self.limits[org].append(limit)
+
+        prices = (card.get('card_prices') or [{}])[0]
+        for vendor in PRICE_VENDORS:
+            self.prices[vendor].append(prices.get(vendor) or 0.0)
+        return row
+
+    def remove(self, card_id: int) -> None:
+        self.rows.pop(card_id, None)
+
+    def analyze(self, sections: dict[str, list[int]]) -> dict:
+        """Legality per ban org, price totals and distributions of a parsed deck."""
+        rows = self.rows
+        copies: Counter = Counter()
+        for section in DECK_SECTIONS:
+            copies.update(card_id for card_id in sections[section] if card_id in rows)
+        missing = sorted({card_id for ids in sections.values() for card_id in ids if card_id not in rows})
+        resolved = [(card_id, rows[card_id], n) for card_id, n in copies.items()]
+
+        errors = []
+        for section, (low, high) in SECTION_SIZES.items():
+            size = len(sections[section])
+            if not low <= size <= high:
+                errors.append(f"{section} deck has {size} cards, it needs {low} to {high}")
+
+        legality = {}
+        for org in BAN_ORGS:
+            limits = self.limits[org]
+            violations = [
+                {
+                    "card_id": card_id,
+                    "name": self.names[row],
+                    "copies": n,
+                    "limit": limits[row]
+                }
+                for card_id, row, n in resolved
+                if n > limits[row]
+            ]
+            legality[org] = {
+                "legal": not violations and not errors and not missing,
+                "over_limit": len(violations),
+                "violations": violations
+            }
+
+        prices = {
+            vendor: round(sum(column[row] * n for _, row, n in resolved), 2)
+            for vendor, column in self.prices.items()
+        }
+
+        # distributions count the copies played in main and extra, not the side deck
+        played: Counter = Counter(
+            card_id for section in ("main", "extra") for card_id in sections[section] if card_id in rows
+        )
+        distribution = {"type": Counter(), "attribute": Counter(), "level": Counter()}
+        for card_id, n in played.items():
+            row = rows[card_id]
+            if self.types[row] is not None:
+                distribution["type"][self.types[row]] += n
+            if self.attributes[row] is not None:
+                distribution["attribute"][self.attributes[row]] += n
+            if self.levels[row] is not None:
+                distribution["level"][str(self.levels[row])] += n
+
+        return {
+            "sizes": {section: len(sections[section]) for section in DECK_SECTIONS},
+            "errors": errors,
+            "missing": missing,
+            "legality": legality,
+            "prices": prices,
+            "distribution": {key: dict(counter) for key, counter in distribution.items()}
+        }
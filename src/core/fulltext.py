@@ -0,0 +1,194 @@
+from collections.abc import Iterable
+from bisect import bisect_left, insort
+import math
+import re
+
+
+WORD = re.compile(r"[^\W_]+")
+# a quoted phrase, or a single word optionally ending in * for a prefix match
+QUERY_TOKEN = re.compile(r'"([^"]*)"?|([^\W_]+)(\*)?')
+STOP_WORDS = frozenset((
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "for", "from", "if", "in",
+    "into", "is", "it", "its", "of", "on", "or", "so", "such", "than", "that", "the",
+    "their", "then", "there", "these", "they", "this", "to", "was", "were", "will", "with"
+))
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def stem(word: str) -> str:
+    """Light suffix stripping, close enough to the english snowball stemmer for card text."""
+    if len(word) <= 3:
+        return word
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith("sses"):
+        return word[:-2]
+    if word.endswith("ing") and len(word) > 5:
+        return word[:-3]
+    if word.endswith("ed") and len(word) > 4:
+        return word[:-2]
+    if word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str) -> list[str | None]:
+    """Stemmed words of `text`, stop words kept as None so phrase positions line up."""
+    return [None if word in STOP_WORDS else stem(word) for word in WORD.findall(text.lower())]
+
+
+def parse_query(text: str) -> list[list[tuple[int, str, bool]]]:
+    """
+        Parses `text` into clauses that must all match. A clause is a list of
+        (position offset, word, is prefix) and matches when its words
+        appear at those offsets: one word for a plain term or `word*` prefix,
+        several for a "quoted phrase".
+    """
+    clauses = []
+    for match in QUERY_TOKEN.finditer(text.lower()):
+        phrase, word, star = match.groups()
+        if word is not None:
+            prefix = star is not None
+            if not prefix and word in STOP_WORDS:
+                continue
+            clauses.append([(0, word, prefix)])
+            continue
+        words = WORD.findall(phrase or '')
+        clause = [
+            (offset, w, False)
+            for offset, w in enumerate(words) if w not in STOP_WORDS
+        ]
+        if clause:
+            start = clause[0][0]
+            clauses.append([(offset - start, w, prefix) for offset, w, prefix in clause])
+    return clauses
+
+
+def to_tsquery(clauses: list[list[tuple[int, str, bool]]]) -> str:
+    """Same query in to_tsquery syntax, e.g. `special <-> summon & graveyard & destr:*`. Postgres does the stemming."""
+    parts = []
+    for clause in clauses:
+        words = []
+        previous = 0
+        for offset, word, prefix in clause:
+            if words:
+                gap = offset - previous
+                words.append("<->" if gap == 1 else f"<{gap}>")
+            words.append(f"{word}:*" if prefix else word)
+            previous = offset
+        parts.append(f"({' '.join(words)})" if len(clause) > 1 else words[0])
+    return " & ".join(parts)
+
+
+class TextIndex:
+    """
+        Positional inverted index over card text, ranked with BM25.
+        In-memory counterpart of the tsvector GIN index on cards_mv.
+    """
+
+    def __init__(self, texts: Iterable[str]):
+        self.size = 0
+        self.total_length = 0
+        self.lengths: list[int] = []
+        # term -> row -> positions
+        self.postings: dict[str, dict[int, list[int]]] = {}
+        for text in texts:
+            self._index(text)
+        self.terms: list[str] = sorted(self.postings)
+
+    @property
+    def average_length(self) -> float:
+        return self.total_length / self.size if self.size else 0.0
+
+    def _index(self, text: str) -> tuple[int, list[str]]:
+        row = len(self.lengths)
+        tokens = tokenize(text)
+        self.lengths.append(len(tokens))
+        self.size += 1
+        self.total_length += len(tokens)
+        new_terms = []
+        for position, term in enumerate(tokens):
+            if term is not None:
+                if term not in self.postings:
+                    self.postings[term] = {}
+                    new_terms.append(term)
+                self.postings[term].setdefault(row, []).append(position)
+        return row, new_terms
+
+    def add(self, text: str) -> int:
+        """Indexes one more row, returns its position."""
+        row, new_terms = self._index(text)
+        for term in new_terms:
+            insort(self.terms, term)
+        return row
+
+    def remove(self, row: int, text: str) -> None:
+        for term in set(tokenize(text)):
+            positions = self.postings.get(term)
+            if positions is None or positions.pop(row, None) is None:
+                continue
+            if not positions:
+                del self.postings[term]
+                self.terms.pop(bisect_left(self.terms, term))
+        self.size -= 1
+        self.total_length -= self.lengths[row]
+
+    def _positions(self, word: str, prefix: bool) -> dict[int, list[int]]:
+        word = stem(word)
+        if not prefix:
+            return self.postings.get(word, {})
+        merged: dict[int, list[int]] = {}
+        i = bisect_left(self.terms, word)
+        while i < len(self.terms) and self.terms[i].startswith(word):
+            for row, positions in self.postings[self.terms[i]].items():
+                merged.setdefault(row, []).extend(positions)
+            i += 1
+        return merged
+
+    def _clause_frequencies(self, clause: list[tuple[int, str, bool]]) -> dict[int, int]:
+        """row -> how many times the clause occurs in it."""
+        words = [(offset, self._positions(word, prefix)) for offset, word, prefix in clause]
+        words.sort(key=lambda item: len(item[1]))
+        _, rarest = words[0]
+        frequencies: dict[int, int] = {}
+        for row in rarest:
+            if any(row not in positions for _, positions in words):
+                continue
+            if len(clause) == 1:
+                frequencies[row] = len(rarest[row])
+                continue
+            offsets = [(offset, set(positions[row])) for offset, positions in words]
+            first, _ = offsets[0]
+            hits = sum(
+                1 for start in sorted(offsets[0][1])
+                if all(start - first + offset in positions for offset, positions in offsets[1:])
+            )
+            if hits:
+                frequencies[row] = hits
+        return frequencies
+
+    def scores(self, text: str, rows: set[int] | None = None) -> dict[int, float]:
+        """BM25 score of every row (restricted to `rows`) matching all the clauses of `text`."""
+        clauses = parse_query(text)
+        if not clauses:
+            return {}
+        result: dict[int, float] | None = None
+        for clause in clauses:
+            # document frequency counts every row, not only the ones `rows` keeps
+            frequencies = self._clause_frequencies(clause)
+            df = len(frequencies)
+            idf = math.log(1 + (self.size - df + 0.5) / (df + 0.5))
+            clause_scores: dict[int, float] = {}
+            for row, tf in frequencies.items():
+                if rows is not None and row not in rows:
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[row] / self.average_length)
+                clause_scores[row] = idf * tf * (BM25_K1 + 1) / (tf + norm)
+            if result is None:
+                result = clause_scores
+            else:
+                result = {row: score + clause_scores[row] for row, score in result.items() if row in clause_scores}
+            if not result:
+                return {}
+        return result
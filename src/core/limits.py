@@ -0,0 +1,87 @@
+from fastapi.exceptions import HTTPException
+from src.core.payload import FastJSONResponse
+from fastapi import status
+
+
+class RequestBodyTooLarge(HTTPException):
+
+    def __init__(self, limit: int):
+        super().__init__(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Request body too large. Max {limit} bytes."
+        )
+
+
+class BodySizeLimit:
+    """
+        Pure ASGI limit on request bodies, nothing is buffered. A declared
+        Content-Length over the limit is answered with 413 before the app
+        runs. A body without one (chunked) is counted as the app receives
+        it and reading fails with 413 once it passes the limit.
+    """
+
+    def __init__(self, app, max_body_size: int, route_limits: dict[str, int] | None = None):
+        self.app = app
+        self.max_body_size = max_body_size
+        # path prefix -> limit, the longest matching prefix wins
+        self.route_limits: list[tuple[str, int]] = sorted(
+            (route_limits or {}).items(), key=lambda item: len(item[0]), reverse=True
+        )
+
+    def limit_for(self, path: str) -> int:
+        for prefix, limit in self.route_limits:
+            if path.startswith(prefix):
+                return limit
+        return self.max_body_size
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        limit: int = self.limit_for(scope["path"])
+        content_length: bytes | None = next(
+            (value for name, value in scope["headers"] if name == b"content-length"), None
+        )
+        if content_length is not None:
+            # the server never hands over more than the declared length, so there is nothing to count
+            if content_length.isdigit() and int(content_length) > limit:
+                await self.reject(limit, scope, receive, send)
+                return
+            await self.app(scope, receive, send)
+            return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise RequestBodyTooLarge(limit)
+            return message
+
+        async def tracked_send(message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except RequestBodyTooLarge:
+            # raised outside the routes (middleware reading the body), answered here when still possible
+            if response_started:
+                raise
+            await self.reject(limit, scope, receive, send)
+
+    async def reject(self, limit: int, scope, receive, send) -> None:
+        error = RequestBodyTooLarge(limit)
+        response = FastJSONResponse(
+            status_code=error.status_code,
+            content={"detail": error.detail},
+            headers={"Connection": "close"}
+        )
+        await response(scope, receive, send)
@@ -0,0 +1,210 @@
+from fastapi.responses import JSONResponse, Response
+from collections.abc import Iterable, Mapping, Sequence
+from datetime import date, datetime, time
+from fastapi import status
+from decimal import Decimal
+from uuid import UUID
+import hashlib
+import gzip
+import json
+import zlib
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+# preferred order when the client accepts several encodings with the same q
+ENCODINGS = ("br", "zstd", "gzip", "identity")
+# orjson, msgspec or json, the fastest installed one when unset
+JSON_ENCODER = os.getenv("JSON_ENCODER") or ("orjson" if orjson else "msgspec" if msgspec else "json")
+
+
+def _default(value):
+    """Values the encoders don't know natively: Decimal as a number, other mappings and sequences as objects and arrays."""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, Mapping):
+        return dict(value)
+    if isinstance(value, (Sequence, set, frozenset)) and not isinstance(value, (str, bytes)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _encode_json_stdlib(content) -> bytes:
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+        default=_default
+    ).encode("utf-8")
+
+
+def _json_encoder():
+    if JSON_ENCODER == "orjson" and orjson is not None:
+        # int keys are written as strings, like json.dumps does
+        return lambda content: orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    if JSON_ENCODER == "msgspec" and msgspec is not None:
+        return msgspec.json.Encoder(enc_hook=_default, decimal_format="number").encode
+    if JSON_ENCODER != "json":
+        print(f"[JSON ENCODER] {JSON_ENCODER} is not installed, using json")
+    return _encode_json_stdlib
+
+
+_ENCODE = _json_encoder()
+_DECODE = orjson.loads if orjson is not None else json.loads
+
+
+def encode_json(content) -> bytes:
+    """
+        Compact utf-8 JSON of `content` with the JSON_ENCODER engine. Dates
+        and times are written in ISO format and Decimals as numbers.
+    """
+    return _ENCODE(content)
+
+
+def decode_json(body: bytes | str):
+    return _DECODE(body)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+        JSONResponse rendered by encode_json. Routes return it directly, so
+        FastAPI skips response_model validation of the rows, the models only
+        document the schema.
+    """
+
+    def render(self, content) -> bytes:
+        return encode_json(content)
+
+
+def parse_accept_encoding(accept_encoding: str | None) -> dict[str, float]:
+    accepted: dict[str, float] = {}
+    if not accept_encoding:
+        return accepted
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+class EncodedPayload:
+    """
+        A JSON body encoded once, with its compressed variants kept in memory
+        so the same representation is never encoded twice. The uncompressed
+        body is most of the size and rarely asked for, it is inflated from
+        gzip on demand.
+    """
+
+    def __init__(self, content, media_type: str = "application/json"):
+        self.media_type = media_type
+        self._compress([content if isinstance(content, bytes) else encode_json(content)])
+
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[bytes], media_type: str = "application/json") -> "EncodedPayload":
+        """The body given in pieces, compressed as they come so it is never held whole."""
+        payload = cls.__new__(cls)
+        payload.media_type = media_type
+        payload._compress(chunks)
+        return payload
+
+    def _compress(self, chunks: Iterable[bytes]) -> None:
+        digest = hashlib.sha256()
+        # wbits 31 writes the gzip container
+        deflate = zlib.compressobj(6, zlib.DEFLATED, 31)
+        compressors = {"gzip": (deflate.compress, deflate.flush)}
+        if brotli is not None:
+            br = brotli.Compressor(quality=6)
+            compressors["br"] = (br.process, br.finish)
+        if zstandard is not None:
+            zstd = zstandard.ZstdCompressor(level=10).compressobj()
+            compressors["zstd"] = (zstd.compress, zstd.flush)
+        parts: dict[str, list[bytes]] = {coding: [] for coding in compressors}
+        for chunk in chunks:
+            digest.update(chunk)
+            for coding, (compress, _) in compressors.items():
+                parts[coding].append(compress(chunk))
+        for coding, (_, finish) in compressors.items():
+            parts[coding].append(finish())
+        self.variants: dict[str, bytes] = {coding: b"".join(compressed) for coding, compressed in parts.items()}
+        tag = digest.hexdigest()[:32]
+        self.etags: dict[str, str] = {"identity": f'"{tag}"'} | {
+            coding: f'"{tag}-{coding}"' for coding in self.variants
+        }
+
+    @property
+    def body(self) -> bytes:
+        """The uncompressed body, inflated again on every call."""
+        return gzip.decompress(self.variants["gzip"])
+
+    def encoded(self, coding: str) -> bytes:
+        return self.body if coding == "identity" else self.variants[coding]
+
+    def negotiate(self, accept_encoding: str | None) -> str:
+        accepted = parse_accept_encoding(accept_encoding)
+        if not accepted:
+            return "identity"
+
+        def quality(coding: str) -> float:
+            # identity is always acceptable unless explicitly refused
+            default = 0.001 if coding == "identity" else 0.0
+            return accepted.get(coding, accepted.get("*", default))
+
+        # max() keeps the first of equal candidates, so ENCODINGS breaks ties
+        best = max((coding for coding in ENCODINGS if coding in self.etags), key=quality)
+        return best if quality(best) > 0 else "identity"
+
+    def not_modified(self, if_none_match: str | None) -> bool:
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return any(etag in tags for etag in self.etags.values())
+
+    def response(
+        self,
+        accept_encoding: str | None,
+        if_none_match: str | None,
+        status_code: int = status.HTTP_200_OK
+    ) -> Response:
+        coding = self.negotiate(accept_encoding)
+        headers = {"ETag": self.etags[coding], "Vary": "Accept-Encoding"}
+        if self.not_modified(if_none_match):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        if coding != "identity":
+            headers["Content-Encoding"] = coding
+        return Response(self.encoded(coding), status_code, headers, self.media_type)
@@ -0,0 +1,202 @@
+from src import globals
+from src.core import snapshot
+from src.core import db
+import psycopg
+import asyncio
+import os
+
+
+# writes within this many seconds of each other share one refresh
+VIEW_REFRESH_DELAY = float(os.getenv("VIEW_REFRESH_DELAY", "5"))
+# how often a worker checks whether another process published a new snapshot
+SNAPSHOT_POLL_INTERVAL = float(os.getenv("SNAPSHOT_POLL_INTERVAL", "10"))
+# cards_mv is kept current by triggers, only the views built from it are refreshed here
+VIEW_REFRESH_ORDER = ("card_sets_mv", )
+# pending target that rewrites the card snapshot file once the views are done
+SNAPSHOT_TARGET = "snapshot"
+# notifications this close together are answered with one reload, populate.py sends hundreds
+HOT_RELOAD_DELAY = float(os.getenv("HOT_RELOAD_DELAY", "1"))
+# seconds before a lost LISTEN connection is opened again
+LISTEN_RETRY_INTERVAL = float(os.getenv("LISTEN_RETRY_INTERVAL", "5"))
+# payloads of db.DATA_CHANGED_CHANNEL, "cards:<ids>" carries the changed card ids
+RELOAD_KINDS = ("enums", "sets", "cards")
+
+PENDING: set[str] = set()
+TASK: asyncio.Task | None = None
+RELOAD_PENDING: set[str] = set()
+# card ids of "cards:<ids>" notifications not applied yet
+RELOAD_CARD_IDS: set[int] = set()
+# past this many notified cards (a populate, a price update) the catalog is reloaded whole in a thread
+CARD_DELTA_LIMIT = int(os.getenv("CARD_DELTA_LIMIT", "300"))
+RELOAD_TASK: asyncio.Task | None = None
+
+
+def schedule_view_refresh(*views: str) -> None:
+    """
+        Queues a background REFRESH of `views` and a new card snapshot for
+        the other workers. The catalog of this worker is already up to
+        date, this only catches the views and the other processes up.
+    """
+    global TASK
+    PENDING.update(views)
+    PENDING.add(SNAPSHOT_TARGET)
+    if TASK is None or TASK.done():
+        TASK = asyncio.create_task(_refresh_views())
+
+
+async def _refresh_views() -> None:
+    while PENDING:
+        await asyncio.sleep(VIEW_REFRESH_DELAY)
+        await _refresh(_take_pending())
+
+
+def _take_pending() -> list[str]:
+    targets = [view for view in VIEW_REFRESH_ORDER if view in PENDING]
+    if SNAPSHOT_TARGET in PENDING:
+        targets.append(SNAPSHOT_TARGET)
+    PENDING.clear()
+    return targets
+
+
+async def _refresh(targets: list[str]) -> None:
+    views = [view for view in targets if view != SNAPSHOT_TARGET]
+    try:
+        async with db.POOL.connection() as conn:
+            if views:
+                async with conn.cursor() as cur:
+                    for view in views:
+                        await cur.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view};")
+                    # only the sets move, the cards of the other workers stay as they are
+                    version: dict = await db.bump_sets_version(cur)
+                await conn.commit()
+                globals.globals_set_data_tag(globals.globals_get_cards_version(), version['updated_at'], version['sets_version'])
+                print(f"[VIEW REFRESH] {', '.join(views)}")
+            if SNAPSHOT_TARGET in targets:
+                await publish_snapshot(conn)
+    except asyncio.CancelledError:
+        # the transaction is rolled back, a flush runs the targets again
+        PENDING.update(targets)
+        raise
+    except Exception as e:
+        print(f"[EXCEPTION _refresh] | {targets} | {e}")
+
+
+async def publish_snapshot(conn) -> None:
+    """Writes cards_mv to the snapshot file, the other workers swap to it on their next poll."""
+    async with conn.cursor() as cur:
+        # the version is read before the cards so it is never newer than them
+        version: dict = await db.get_data_version(cur)
+        await cur.execute("SELECT * FROM cards_mv;")
+        cards: list[dict] = await cur.fetchall()
+    await conn.commit()
+    if snapshot.snapshot_version() == version['version']:
+        # a worker reloading on the notification of this version already wrote it
+        return
+    await asyncio.to_thread(snapshot.write_snapshot, cards, version['version'], version['updated_at'])
+
+
+async def flush_view_refresh() -> None:
+    """Runs the queued refresh now instead of after the delay, called before the pool closes."""
+    global TASK
+    if TASK is not None and not TASK.done():
+        TASK.cancel()
+        try:
+            await TASK
+        except asyncio.CancelledError:
+            pass
+    TASK = None
+    if PENDING:
+        await _refresh(_take_pending())
+
+
+async def watch_snapshot() -> None:
+    """Swaps in a snapshot another process renamed over the file, until cancelled."""
+    while True:
+        await asyncio.sleep(SNAPSHOT_POLL_INTERVAL)
+        try:
+            await asyncio.to_thread(globals.globals_reload_snapshot)
+        except Exception as e:
+            print(f"[EXCEPTION watch_snapshot] | {e}")
+
+
+async def watch_changes() -> None:
+    """Keeps this worker's cards and enums current, until cancelled."""
+    await asyncio.gather(watch_snapshot(), listen_for_changes())
+
+
+async def listen_for_changes() -> None:
+    """LISTENs on db.DATA_CHANGED_CHANNEL and queues a reload of what the notification names."""
+    try:
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(**db.DATABASE_CONFIG, autocommit=True) as conn:
+                    await conn.execute(f"LISTEN {db.DATA_CHANGED_CHANNEL};")
+                    # catches up with what changed while nobody was listening
+                    schedule_hot_reload(*RELOAD_KINDS)
+                    async for notify in conn.notifies():
+                        kind, _, ids = notify.payload.partition(":")
+                        if kind not in RELOAD_KINDS:
+                            continue
+                        if ids and "cards" not in RELOAD_PENDING:
+                            RELOAD_CARD_IDS.update(int(card_id) for card_id in ids.split(","))
+                            if len(RELOAD_CARD_IDS) > CARD_DELTA_LIMIT:
+                                RELOAD_CARD_IDS.clear()
+                                schedule_hot_reload("cards")
+                            else:
+                                schedule_hot_reload()
+                        elif not ids:
+                            if kind == "cards":
+                                RELOAD_CARD_IDS.clear()
+                            schedule_hot_reload(kind)
+            except psycopg.Error as e:
+                print(f"[EXCEPTION listen_for_changes] | {e}")
+            await asyncio.sleep(LISTEN_RETRY_INTERVAL)
+    finally:
+        if RELOAD_TASK is not None:
+            RELOAD_TASK.cancel()
+
+
+def schedule_hot_reload(*kinds: str) -> None:
+    global RELOAD_TASK
+    RELOAD_PENDING.update(kinds)
+    if RELOAD_TASK is None or RELOAD_TASK.done():
+        RELOAD_TASK = asyncio.create_task(_hot_reload())
+
+
+async def _hot_reload() -> None:
+    """
+        Notified cards are read again and applied to the catalog as deltas.
+        A full reload ("cards" without ids) runs in a thread, requests keep
+        using the old catalog until the new one is complete and swapped in.
+    """
+    while RELOAD_PENDING or RELOAD_CARD_IDS:
+        await asyncio.sleep(HOT_RELOAD_DELAY)
+        kinds: set[str] = set(RELOAD_PENDING)
+        card_ids: list[int] = sorted(RELOAD_CARD_IDS)
+        RELOAD_PENDING.clear()
+        RELOAD_CARD_IDS.clear()
+        try:
+            if "enums" in kinds:
+                await asyncio.to_thread(globals.globals_reload_enums)
+            if "cards" in kinds:
+                # a full reload covers the notified ids too
+                if await asyncio.to_thread(globals.globals_reload_cards):
+                    print(f"[HOT RELOAD] cards | version: {globals.globals_get_data_tag()}")
+            elif card_ids:
+                await apply_card_changes(card_ids)
+            if "sets" in kinds:
+                await asyncio.to_thread(globals.globals_reload_sets_version)
+        except Exception as e:
+            print(f"[EXCEPTION _hot_reload] | {kinds} | {len(card_ids)} cards | {e}")
+
+
+async def apply_card_changes(card_ids: list[int]) -> None:
+    async with db.POOL.connection() as conn:
+        async with conn.cursor() as cur:
+            # the version is read before the cards so it is never newer than them
+            version: dict = await db.get_data_version(cur)
+            cards: list[dict] = await db.get_cards_by_ids(cur, card_ids)
+    # comparing with the catalog decodes its rows, only the changed ones are upserted on the event loop
+    changed, removed = await asyncio.to_thread(globals.globals_diff_cards, card_ids, cards)
+    globals.globals_apply_cards(changed, removed, version)
+    print(f"[HOT RELOAD] {len(changed)} cards | {len(removed)} removed | version: {globals.globals_get_data_tag()}")
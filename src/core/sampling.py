@@ -0,0 +1,32 @@
+from typing import Sequence
+import random
+
+
+def sample_page(population: Sequence, limit: int, offset: int, seed: int | None = None) -> list:
+    """
+        Random page of `population`.
+
+        Without a seed this is an O(limit) sample and offset is meaningless.
+        With a seed, pages are slices of one shuffled order: a sparse
+        Fisher-Yates shuffle stopped after offset + limit swaps, so every
+        page of the same seed is stable and no two pages overlap. Only the
+        swapped positions are kept, population is never copied.
+    """
+    size = len(population)
+    if seed is None:
+        return random.sample(population, min(limit, size))
+
+    end = min(offset + limit, size)
+    if offset >= end:
+        return []
+    rng = random.Random(seed)
+    # position -> index of population now at that position, untouched positions hold themselves
+    swapped: dict[int, int] = {}
+    page: list = []
+    for i in range(end):
+        j = i + rng.randrange(size - i)
+        picked = swapped.get(j, j)
+        swapped[j] = swapped.get(i, i)
+        if i >= offset:
+            page.append(population[picked])
+    return page
@@ -0,0 +1,191 @@
+from collections.abc import Sequence, Iterator
+from datetime import datetime
+from src.core.payload import encode_json, decode_json
+from collections import OrderedDict
+from contextlib import contextmanager
+from threading import Lock
+import struct
+import fcntl
+import mmap
+import os
+
+
+CARD_SNAPSHOT_PATH = os.getenv("CARD_SNAPSHOT_PATH", "tmp/cards.snapshot")
+# decoded cards kept per worker (~3 KB each), the rows pages keep reading are not decoded again
+SNAPSHOT_ROW_CACHE = int(os.getenv("SNAPSHOT_ROW_CACHE", "2048"))
+SNAPSHOT_MAGIC = b"YGOSNAP1"
+# magic, header length
+PREAMBLE = struct.Struct("<8sI")
+# card_id, offset into the bodies, body length
+ENTRY = struct.Struct("<qQI")
+
+
+def write_snapshot(cards: list[dict], version: int, updated_at: datetime | None, path: str = CARD_SNAPSHOT_PATH) -> None:
+    """
+        Writes `cards` as one json body per card behind a fixed width index.
+        The file is written next to `path` and renamed over it, readers
+        holding the old file keep their mapping.
+    """
+    bodies: list[bytes] = [encode_json(card) for card in cards]
+    header: bytes = encode_json({
+        "version": version,
+        "updated_at": updated_at.isoformat() if updated_at is not None else None,
+        "count": len(cards)
+    })
+    directory: str = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    tmp: str = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(PREAMBLE.pack(SNAPSHOT_MAGIC, len(header)))
+            f.write(header)
+            offset = 0
+            for card, body in zip(cards, bodies):
+                f.write(ENTRY.pack(card['card_id'], offset, len(body)))
+                offset += len(body)
+            for body in bodies:
+                f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except OSError:
+        # a half written file would only fill the disk further
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    print(f"[SNAPSHOT WRITE] {path} | version: {version} | cards: {len(cards)} | bytes: {offset}")
+
+
+class Snapshot(Sequence):
+    """
+        Read only view over a snapshot file. The file is memory mapped, so
+        every worker on the box shares the same pages, and a card is only
+        decoded when it is read. The last SNAPSHOT_ROW_CACHE cards read are
+        kept decoded and must be treated as read only.
+    """
+
+    def __init__(self, path: str = CARD_SNAPSHOT_PATH):
+        self.path = path
+        with open(path, "rb") as f:
+            self.stat = os.fstat(f.fileno())
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, header_length = PREAMBLE.unpack_from(self.mm, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a card snapshot")
+        header: dict = decode_json(self.mm[PREAMBLE.size:PREAMBLE.size + header_length])
+        self.version: int = header['version']
+        self.updated_at: datetime | None = (
+            datetime.fromisoformat(header['updated_at']) if header['updated_at'] is not None else None
+        )
+        self.count: int = header['count']
+        self.index_start: int = PREAMBLE.size + header_length
+        self.bodies_start: int = self.index_start + self.count * ENTRY.size
+        # row -> decoded card, least recently read first
+        self.decoded: OrderedDict[int, dict] = OrderedDict()
+        self.decoded_lock = Lock()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, row: int) -> dict:
+        if SNAPSHOT_ROW_CACHE <= 0:
+            return self.decode(row)
+        with self.decoded_lock:
+            card: dict | None = self.decoded.get(row)
+            if card is not None:
+                self.decoded.move_to_end(row)
+                return card
+        card = self.decode(row)
+        with self.decoded_lock:
+            self.decoded[row] = card
+            if len(self.decoded) > SNAPSHOT_ROW_CACHE:
+                self.decoded.popitem(last=False)
+        return card
+
+    def decode(self, row: int) -> dict:
+        if not 0 <= row < self.count:
+            raise IndexError(row)
+        _, offset, length = ENTRY.unpack_from(self.mm, self.index_start + row * ENTRY.size)
+        start: int = self.bodies_start + offset
+        return decode_json(self.mm[start:start + length])
+
+    def __iter__(self) -> Iterator[dict]:
+        # full scans (catalog build, all cards payload) would only flush the cache
+        for row in range(self.count):
+            yield self.decode(row)
+
+    def is_current(self) -> bool:
+        """False once another snapshot has been renamed over `path`."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return True
+        return (stat.st_ino, stat.st_mtime_ns) == (self.stat.st_ino, self.stat.st_mtime_ns)
+
+
+class SnapshotCards(Sequence):
+    """The card rows of a catalog: the snapshot, then the cards written since it was loaded."""
+
+    def __init__(self, snapshot: Snapshot):
+        self.snapshot = snapshot
+        self.appended: list[dict] = []
+
+    def __len__(self) -> int:
+        return len(self.snapshot) + len(self.appended)
+
+    def __getitem__(self, row: int) -> dict:
+        if row >= len(self.snapshot):
+            return self.appended[row - len(self.snapshot)]
+        return self.snapshot[row]
+
+    def __iter__(self) -> Iterator[dict]:
+        yield from self.snapshot
+        yield from self.appended
+
+    def decode(self, row: int) -> dict:
+        """Reads `row` without going through the decoded cards cache."""
+        if row >= len(self.snapshot):
+            return self.appended[row - len(self.snapshot)]
+        return self.snapshot.decode(row)
+
+    def append(self, card: dict) -> None:
+        self.appended.append(card)
+
+
+@contextmanager
+def snapshot_lock(path: str = CARD_SNAPSHOT_PATH):
+    """Exclusive lock between the processes sharing `path`."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.lock", "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def snapshot_version(path: str = CARD_SNAPSHOT_PATH) -> int | None:
+    """Version held by the file at `path`, None when there is no readable snapshot."""
+    try:
+        with open(path, "rb") as f:
+            magic, header_length = PREAMBLE.unpack(f.read(PREAMBLE.size))
+            if magic != SNAPSHOT_MAGIC:
+                return None
+            return decode_json(f.read(header_length))['version']
+    except (OSError, ValueError, KeyError, struct.error):
+        return None
+
+
+def load_snapshot(version: int | None, path: str = CARD_SNAPSHOT_PATH) -> Snapshot | None:
+    """The snapshot at `path` when it holds `version` (any version when None), otherwise None."""
+    try:
+        snapshot = Snapshot(path)
+    except FileNotFoundError:
+        return None
+    except (ValueError, struct.error) as e:
+        print(f"[SNAPSHOT SKIP] {path} | {e}")
+        return None
+    if version is not None and snapshot.version != version:
+        print(f"[SNAPSHOT SKIP] {path} | version {snapshot.version} is not {version}")
+        return None
+    return snapshot
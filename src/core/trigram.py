@@ -0,0 +1,83 @@
+from array import array
+import re
+
+
+WORD = re.compile(r"[^\W_]+")
+
+
+def trigrams(text: str) -> set[str]:
+    """Same trigrams pg_trgm extracts: lowercase words padded with two spaces before and one after."""
+    result: set[str] = set()
+    for word in WORD.findall(text.lower()):
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            result.add(padded[i:i + 3])
+    return result
+
+
+def similarity(a: set[str], b: set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+class TrigramIndex:
+    """
+        In-memory counterpart of a gin_trgm_ops index. Scores rows with the
+        pg_trgm similarity: shared trigrams / trigrams in either string.
+    """
+
+    def __init__(self, texts: list[str]):
+        self.sizes = array('H')
+        # row positions in machine arrays, no int object per entry
+        self.postings: dict[str, array] = {}
+        for text in texts:
+            self.add(text)
+
+    def add(self, text: str) -> int:
+        """Indexes one more row, returns its position."""
+        row = len(self.sizes)
+        grams = trigrams(text)
+        self.sizes.append(len(grams))
+        for gram in grams:
+            self.postings.setdefault(gram, array('I')).append(row)
+        return row
+
+    def remove(self, row: int, text: str) -> None:
+        for gram in trigrams(text):
+            posting = self.postings.get(gram)
+            if posting is not None and row in posting:
+                posting.remove(row)
+                if not posting:
+                    del self.postings[gram]
+
+    def scores(
+        self,
+        term: str,
+        threshold: float,
+        rows: set[int] | None = None
+    ) -> dict[int, float]:
+        """Similarity of every row (restricted to `rows`) scoring at least `threshold`."""
+        query = trigrams(term)
+        if not query:
+            return {}
+        shared: dict[int, int] = {}
+        for gram in query:
+            for row in self.postings.get(gram, ()):
+                shared[row] = shared.get(row, 0) + 1
+
+        size = len(query)
+        # similarity can't exceed min(|a|, |b|) / max(|a|, |b|), skip rows outside that band
+        low, high = size * threshold, size / threshold if threshold > 0 else float("inf")
+        result: dict[int, float] = {}
+        for row, count in shared.items():
+            if rows is not None and row not in rows:
+                continue
+            row_size = self.sizes[row]
+            if row_size < low or row_size > high:
+                continue
+            score = count / (size + row_size - count)
+            if score >= threshold:
+                result[row] = score
+        return result
@@ -0,0 +1,54 @@
+from email.utils import format_datetime, parsedate_to_datetime
+from datetime import datetime, timezone
+from urllib.parse import parse_qsl
+import hashlib
+
+
+# GET endpoints whose responses only change with the data version, added enum values move no version
+VERSIONED_PREFIXES = ("/cards", "/sets", "/trivias")
+
+
+def is_versioned(method: str, path: str, query_string: str) -> bool:
+    """Random orders change on every request, so they never get a validator."""
+    if method not in ("GET", "HEAD") or not path.startswith(VERSIONED_PREFIXES):
+        return False
+    return not any(
+        key in ("sort_by", "order_by") and value.lower() == "random"
+        for key, value in parse_qsl(query_string)
+    )
+
+
+def version_etag(data_tag: str, path: str, query_string: str) -> str:
+    """Weak ETag of the data version plus the path and the query with its parameters sorted."""
+    query = sorted(parse_qsl(query_string, keep_blank_values=True))
+    digest = hashlib.sha256(repr((path.rstrip("/"), query)).encode("utf-8")).hexdigest()[:24]
+    return f'W/"{data_tag}-{digest}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def not_modified_since(if_modified_since: str | None, last_modified: datetime | None) -> bool:
+    if not if_modified_since or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        return False
+    # HTTP dates have second precision
+    return last_modified.replace(microsecond=0) <= since
+
+
+def http_date(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
@@ -1,5 +1,11 @@
+from src.core.catalog import CardCatalog, LiveCards
+from src.core.snapshot import Snapshot, SnapshotCards
+from src.core import snapshot
 from src.core import db
+from psycopg import Cursor
+from datetime import datetime
 from dotenv import load_dotenv
+import threading
 import os
 
 
@@ -7,47 +13,244 @@ load_dotenv()
 
 
 TOKEN = os.getenv("TOKEN")
-CARDS: list[dict] = []
 ENUMS: dict = {}
+CATALOG: CardCatalog | None = None
+# memory mapped file CATALOG was built from, None when it was read from the database
+SNAPSHOT: Snapshot | None = None
+DATA_VERSION: int = 0
+# data_version.version the catalog holds and data_version.sets_version of card_sets_mv, shared by every worker
+CARDS_VERSION: int = 0
+SETS_VERSION: int = 0
+# both versions, the ETags are built from it
+DATA_TAG: str = ''
+LAST_MODIFIED: datetime | None = None
+# one catalog rebuild at a time, the snapshot watcher and the hot reload run in threads
+RELOAD_LOCK = threading.Lock()
+ENUM_TYPES = {
+    'archetype': "archetype_enum",
+    'attribute': "attribute_enum",
+    'frametype': "frametype_enum",
+    'race': "race_enum",
+    'type': "type_enum"
+}
 
 
 def globals_init() -> None:
-    global ENUMS, CARDS
+    global ENUMS
 
     # INIT DB
     conn, cur = db.db_instance()
     
     # ENUMS
-    archetypes = db.db_get_enum_list(cur, "archetype_enum")
-    attributes = db.db_get_enum_list(cur, "attribute_enum")
-    frametypes = db.db_get_enum_list(cur, "frametype_enum")
-    races = db.db_get_enum_list(cur, "race_enum")
-    types = db.db_get_enum_list(cur, "type_enum")
-    ENUMS = {
-        'archetype': {'set': set(archetypes), 'list': archetypes},
-        'attribute': {'set': set(attributes), 'list': attributes},
-        'frametype': {'set': set(frametypes), 'list': frametypes},
-        'race': {'set': set(races), 'list': races},
-        'type': {'set': set(types), 'list': types}
-    }
+    ENUMS = globals_read_enums(cur)
+
+    # DATA VERSION, read before the cards so it is never newer than them
+    version: dict | None = db.db_get_data_version(cur)
+    if version is not None:
+        globals_set_data_tag(version['version'], version['updated_at'], version['sets_version'])
 
     # CARDS
-    cur.execute("SELECT * FROM cards_mv;")
-    CARDS = cur.fetchall()
+    globals_load_cards(cur, version)
 
     # CLOSE DB
     cur.close()
     conn.close()    
 
 
-def globals_get_cards() -> list[dict]:
-    global CARDS
-    return CARDS
+def globals_read_enums(cur: Cursor) -> dict:
+    enums: dict = {}
+    for key, enum in ENUM_TYPES.items():
+        values: list[str] = db.db_get_enum_list(cur, enum)
+        enums[key] = {'set': set(values), 'list': values}
+    return enums
+
+
+def globals_load_cards(cur: Cursor, version: dict | None) -> None:
+    """
+        Swaps in the cards of `version`, from the shared snapshot when it
+        holds this version. One worker writes a missing snapshot while the
+        others wait on the lock and map it.
+    """
+    with snapshot.snapshot_lock():
+        loaded: Snapshot | None = snapshot.load_snapshot(version['version'] if version is not None else None)
+        cards: list[dict] = []
+        if loaded is None:
+            cur.execute("SELECT * FROM cards_mv;")
+            cards = cur.fetchall()
+            if cards and version is not None:
+                try:
+                    snapshot.write_snapshot(cards, version['version'], version['updated_at'])
+                    loaded = snapshot.load_snapshot(version['version'])
+                except OSError as e:
+                    # a full or read only disk, the rows just read are served from the heap instead
+                    print(f"[EXCEPTION globals_load_cards] | {snapshot.CARD_SNAPSHOT_PATH} | {e}")
+    if version is not None and CARDS_VERSION > version['version']:
+        # a write of this worker was applied while loading, its catalog is newer
+        return
+    if loaded is not None:
+        globals_set_snapshot(loaded)
+    else:
+        globals_set_cards(cards)
+        if version is not None:
+            globals_set_data_tag(version['version'], version['updated_at'], version['sets_version'])
+
+
+def globals_reload_cards() -> bool:
+    """Rebuilds the catalog aside and swaps it in when the database moved past CARDS_VERSION."""
+    with RELOAD_LOCK:
+        conn, cur = db.db_instance()
+        try:
+            version: dict | None = db.db_get_data_version(cur)
+            if version is None or version['version'] <= CARDS_VERSION:
+                return False
+            globals_load_cards(cur, version)
+            return True
+        finally:
+            cur.close()
+            conn.close()
+
+
+def globals_diff_cards(card_ids: list[int], cards: list[dict]) -> tuple[list[dict], list[int]]:
+    """
+        The cards_mv rows of `card_ids` that differ from the catalog's
+        (this worker's own writes are equal), and the ids without a row,
+        which were deleted. Only reads the catalog, runs in a thread.
+    """
+    catalog: CardCatalog | None = CATALOG
+    found: set[int] = {card['card_id'] for card in cards}
+    if catalog is None:
+        return cards, []
+    changed: list[dict] = [card for card in cards if catalog.by_id.get(card['card_id']) != card]
+    removed: list[int] = [card_id for card_id in card_ids if card_id not in found and card_id in catalog.by_id]
+    return changed, removed
+
+
+def globals_apply_cards(changed: list[dict], removed: list[int], version: dict) -> None:
+    """Applies a delta of globals_diff_cards, read after `version`, to the catalog."""
+    for card in changed:
+        globals_upsert_card(card)
+    for card_id in removed:
+        globals_remove_card(card_id)
+    if version['version'] > CARDS_VERSION:
+        globals_set_data_tag(version['version'], version['updated_at'], version['sets_version'])
+
+
+def globals_reload_sets_version() -> None:
+    """Moves the tag to the current sets_version, card_sets_mv is read from the database per request."""
+    conn, cur = db.db_instance()
+    try:
+        version: dict | None = db.db_get_data_version(cur)
+    finally:
+        cur.close()
+        conn.close()
+    if version is not None:
+        globals_set_data_tag(CARDS_VERSION, version['updated_at'], version['sets_version'])
+
+
+def globals_reload_enums() -> None:
+    global ENUMS
+    conn, cur = db.db_instance()
+    try:
+        ENUMS = globals_read_enums(cur)
+    finally:
+        cur.close()
+        conn.close()
+
+
+def globals_get_cards() -> LiveCards | list:
+    global CATALOG
+    return LiveCards(CATALOG) if CATALOG is not None else []
 
 
 def globals_set_cards(cards: list[dict]) -> None:
-    global CARDS
-    CARDS = cards
+    global CATALOG, SNAPSHOT, DATA_VERSION
+    CATALOG = CardCatalog(cards) if cards else None
+    SNAPSHOT = None
+    DATA_VERSION += 1
+
+
+def globals_set_snapshot(loaded: Snapshot) -> None:
+    """Builds the catalog over a mapped snapshot, then swaps it in with one assignment."""
+    global CATALOG, SNAPSHOT, DATA_VERSION
+    catalog: CardCatalog | None = CardCatalog(SnapshotCards(loaded)) if len(loaded) else None
+    CATALOG, SNAPSHOT = catalog, loaded
+    DATA_VERSION += 1
+    if loaded.version > CARDS_VERSION:
+        globals_set_data_tag(loaded.version, loaded.updated_at)
+    print(f"[SNAPSHOT LOAD] {loaded.path} | version: {loaded.version} | cards: {len(loaded)}")
+
+
+def globals_reload_snapshot() -> bool:
+    """Swaps to the snapshot file when a newer one replaced the one CATALOG was built from."""
+    with RELOAD_LOCK:
+        if SNAPSHOT is not None and SNAPSHOT.is_current():
+            return False
+        loaded: Snapshot | None = snapshot.load_snapshot(None)
+        if loaded is None or loaded.version <= CARDS_VERSION:
+            # notified card changes were already applied, the catalog is at least as new
+            return False
+        globals_set_snapshot(loaded)
+        return True
+
+
+def globals_get_snapshot() -> Snapshot | None:
+    global SNAPSHOT
+    return SNAPSHOT
+
+
+def globals_upsert_card(card: dict) -> None:
+    """Applies one written card to the catalog without reloading cards_mv."""
+    global CATALOG, DATA_VERSION
+    if CATALOG is None:
+        CATALOG = CardCatalog([card])
+    else:
+        CATALOG.upsert(card)
+    DATA_VERSION += 1
+
+
+def globals_remove_card(card_id: int) -> None:
+    global CATALOG, DATA_VERSION
+    if CATALOG is not None:
+        CATALOG.remove(card_id)
+        if CATALOG.size == 0:
+            CATALOG = None
+    DATA_VERSION += 1
+
+
+def globals_get_catalog() -> CardCatalog | None:
+    global CATALOG
+    return CATALOG
+
+
+def globals_get_data_version() -> int:
+    global DATA_VERSION
+    return DATA_VERSION
+
+
+def globals_set_data_tag(version: int, updated_at: datetime | None, sets_version: int | None = None) -> None:
+    """`version` of the cards, `sets_version` of card_sets_mv when known."""
+    global DATA_TAG, LAST_MODIFIED, CARDS_VERSION, SETS_VERSION
+    CARDS_VERSION = version
+    if sets_version is not None:
+        SETS_VERSION = sets_version
+    DATA_TAG = f"{CARDS_VERSION}.{SETS_VERSION}"
+    if updated_at is not None and (LAST_MODIFIED is None or updated_at > LAST_MODIFIED):
+        LAST_MODIFIED = updated_at
+
+
+def globals_get_cards_version() -> int:
+    global CARDS_VERSION
+    return CARDS_VERSION
+
+
+def globals_get_data_tag() -> str:
+    global DATA_TAG
+    return DATA_TAG
+
+
+def globals_get_last_modified() -> datetime | None:
+    global LAST_MODIFIED
+    return LAST_MODIFIED
 
 
 def globals_get_token() -> str:
@@ -0,0 +1,13 @@
+from fastapi.responses import JSONResponse
+from src.core.payload import FastJSONResponse
+from src.core.cache import RESPONSE_CACHE
+from fastapi import APIRouter
+from fastapi import status
+
+
+router = APIRouter()
+
+
+@router.get("/stats")
+async def get_cache_stats() -> JSONResponse:
+    return FastJSONResponse(RESPONSE_CACHE.stats(), status.HTTP_200_OK)
@@ -1,12 +1,12 @@
-from src.services.cards_service import fetch_cards, delete_card_by_id, create_card_service
+from src.services.cards_service import fetch_cards, fetch_cards_by_ids, fetch_autocomplete, delete_card_by_id, create_card_service
 from src.schemas.pagination import CardPagination
 from fastapi.responses import JSONResponse, Response
-from fastapi import APIRouter, Depends, Query
-from src.schemas.card import CardCreate
+from fastapi import APIRouter, Depends, Query, Request
+from src.schemas.card import CardCreate, CardBatch, MAX_BATCH_IDS
 from src.globals import globals_get_token
 from fastapi import HTTPException
 from fastapi import status
-from psycopg import Cursor, Connection
+from psycopg import AsyncCursor, AsyncConnection
 from src.core import db
 
 
@@ -15,23 +15,32 @@ router = APIRouter()
 
 @router.get("/", response_model=CardPagination)
 async def get_cards(
+    request: Request,
     depends=Depends(db.get_db),
     limit: int = Query(64, ge=1, le=999),
     offset: int = Query(0, ge=0),
+    cursor: str | None = Query(None, description='opaque next_cursor of the previous page. seeks past it instead of using offset'),
     search: str | None = Query(None, description='you can search cards by name. search=magician will return all cards with magician in name'),
+    text: str | None = Query(None, description='full-text search on card text. every word must match, "quoted phrases" match in order and word* matches a prefix'),
     card_id: int | None = Query(None, description='will search for a especific card by it card_id'),
-    sort_by: str = Query("name", description="sort by name, attack, defence, level, card_id or random"),
+    sort_by: str = Query("name", description="sort by name, attack, defence, level, card_id, random or relevance (best text matches first, or best name matches for search)"),
     sort_order: str = Query("asc", description="ascending (asc) or descending (desc) order"),
     all_cards: bool = Query(False, description='if true, will return all cards'),
+    export: str | None = Query(None, description='ndjson or json. streams every card matching the filters as it is read, ignoring limit, offset and all_cards'),
     null_first: bool = Query(False),
+    min_similarity: float = Query(0.3, ge=0, le=1, description='with sort_by=relevance, the trigram similarity a name needs to match when it does not contain search'),
+    seed: int | None = Query(None, description='with sort_by=random, pages of the same seed come from one stable shuffle and never overlap'),
+    count: str = Query("exact", description='exact, estimate (query planner estimate) or none (skip the total). totals served from memory are always exact'),
+    fields: str | None = Query(None, description='comma separated card fields to return, e.g. card_id,name,images. card_id and the sort column are always included'),
+    exclude: str | None = Query(None, description='comma separated card fields to leave out, e.g. card_sets,card_prices,banlists'),
     archetype: str | None = Query(None),
     race: str | None = Query(None),
     type: str | None = Query(None),
     attribute: str | None = Query(None),
     frametype: str | None = Query(None)
 ) -> JSONResponse:
-    cur: Cursor = depends.cursor()
-    return fetch_cards(
+    cur: AsyncCursor = depends.cursor()
+    return await fetch_cards(
         cur,
         limit, 
         offset, 
@@ -45,28 +54,76 @@ async def get_cards(
         race, 
         type, 
         attribute, 
-        frametype
+        frametype,
+        request.headers.get("accept-encoding"),
+        request.headers.get("if-none-match"),
+        export,
+        cursor,
+        count,
+        seed,
+        min_similarity,
+        text,
+        fields,
+        exclude
     )
 
 
+@router.get("/autocomplete")
+async def get_autocomplete(
+    q: str = Query(min_length=1, description='prefix of the card name or of one of its words'),
+    limit: int = Query(10, ge=1, le=25),
+    depends=Depends(db.get_db)
+) -> JSONResponse:
+    cur: AsyncCursor = depends.cursor()
+    return await fetch_autocomplete(cur, q, limit)
+
+
+@router.get("/batch")
+async def get_cards_batch(
+    ids: str = Query(description='comma separated card ids'),
+    fields: str | None = Query(None, description='comma separated card fields to return. card_id is always included'),
+    exclude: str | None = Query(None, description='comma separated card fields to leave out'),
+    depends=Depends(db.get_db)
+) -> JSONResponse:
+    try:
+        card_ids = [int(i) for i in ids.split(",") if i.strip()]
+    except ValueError:
+        return Response(content=f'invalid ids -> {ids}', status_code=status.HTTP_400_BAD_REQUEST)
+    if len(card_ids) > MAX_BATCH_IDS:
+        return Response(content=f'at most {MAX_BATCH_IDS} ids per request', status_code=status.HTTP_400_BAD_REQUEST)
+    cur: AsyncCursor = depends.cursor()
+    return await fetch_cards_by_ids(cur, card_ids, fields, exclude)
+
+
+@router.post("/batch")
+async def post_cards_batch(
+    batch: CardBatch,
+    fields: str | None = Query(None, description='comma separated card fields to return. card_id is always included'),
+    exclude: str | None = Query(None, description='comma separated card fields to leave out'),
+    depends=Depends(db.get_db)
+) -> JSONResponse:
+    cur: AsyncCursor = depends.cursor()
+    return await fetch_cards_by_ids(cur, batch.card_ids, fields, exclude)
+
+
 @router.post("/")
-def create_card(card: CardCreate, token: str = Query(), depends=Depends(db.get_db)):
+async def create_card(card: CardCreate, token: str = Query(), depends=Depends(db.get_db)):
     if token != globals_get_token():
         return Response("Now allowed", status.HTTP_401_UNAUTHORIZED)
-    conn: Connection = depends
-    cur: Cursor = conn.cursor()
-    return create_card_service(conn, cur, card)
+    conn: AsyncConnection = depends
+    cur: AsyncCursor = conn.cursor()
+    return await create_card_service(conn, cur, card)
 
 
 @router.delete("/")
-def delete_card(
+async def delete_card(
     card_id: int = Query(),
     token: str = Query(),
     depends=Depends(db.get_db)
 ) -> Response:
     if token != globals_get_token():
         return Response("Now allowed", status.HTTP_401_UNAUTHORIZED)
-    conn: Connection = depends
-    cur: Cursor = conn.cursor()
-    return delete_card_by_id(conn, cur, card_id)
+    conn: AsyncConnection = depends
+    cur: AsyncCursor = conn.cursor()
+    return await delete_card_by_id(conn, cur, card_id)
     
\ No newline at end of file
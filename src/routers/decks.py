@@ -0,0 +1,21 @@
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import JSONResponse
+from src.services import decks_service
+from psycopg import AsyncCursor
+from src.core import db
+
+
+router = APIRouter()
+
+
+@router.post("/ydk")
+async def post_ydk_deck(
+    request: Request,
+    fields: str | None = Query(None, description="comma separated card fields to return. card_id is always included"),
+    exclude: str | None = Query(None, description="comma separated card fields to leave out"),
+    depends = Depends(db.get_db)
+) -> JSONResponse:
+    """The request body is the .ydk file."""
+    body: bytes = await request.body()
+    cur: AsyncCursor = depends.cursor()
+    return await decks_service.check_ydk_deck(cur, body.decode("utf-8", errors="replace"), fields, exclude)
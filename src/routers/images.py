@@ -1,7 +1,7 @@
 from fastapi.exceptions import HTTPException
 from fastapi.responses import JSONResponse
 from src.globals import globals_get_enums
-from psycopg import Connection, Cursor
+from psycopg import AsyncConnection, AsyncCursor
 from fastapi import UploadFile, File, Query, Depends
 from fastapi import APIRouter
 from fastapi import status
@@ -16,8 +16,8 @@ router = APIRouter()
 
 @router.post("/cards")
 async def create_card_image(file: UploadFile = File(...), card_type: str = Query(), depends = Depends(db.get_db)):
-    conn: Connection = depends
-    cur: Cursor = depends.cursor()
+    conn: AsyncConnection = depends
+    cur: AsyncCursor = depends.cursor()
     s3 = YgoS3()
     content: bytes = await file.read()
     if len(content) > MAX_FILE_SIZE:
@@ -2,7 +2,7 @@ from src.schemas.pagination import CardSetPagination, CardPagination
 from fastapi import APIRouter, Depends, Query
 from fastapi.responses import JSONResponse
 from src.services import sets_service
-from psycopg import Cursor
+from psycopg import AsyncCursor
 from src.core import db
 
 
@@ -18,10 +18,12 @@ async def get_sets(
     limit: int = Query(64, ge=1, le=64),
     offset: int = Query(0, ge=0),
     sort_by: str = Query("card_set_code", description="sort by card_set_code, name or price"),
-    sort_order: str = Query("asc", description="ascending or descending order")
+    sort_order: str = Query("asc", description="ascending or descending order"),
+    cursor: str | None = Query(None, description="opaque next_cursor of the previous page. seeks past it instead of using offset"),
+    count: str = Query("exact", description="exact, estimate (query planner estimate) or none (skip the total)")
 ) -> JSONResponse:
-    cur: Cursor = depends.cursor()
-    return sets_service.fetch_sets(
+    cur: AsyncCursor = depends.cursor()
+    return await sets_service.fetch_sets(
         cur, 
         search,
         card_set_id,
@@ -29,7 +31,9 @@ async def get_sets(
         limit, 
         offset, 
         sort_by, 
-        sort_order
+        sort_order,
+        cursor,
+        count
     )
 
 
@@ -41,11 +45,15 @@ async def get_card_sets(
     set_code: str | None = Query(None),
     order_by: str = Query("set_name", description="order by set_name, num_of_cards or tcg_date"),
     sort_order: str = Query("asc", description="ascending or descending order"),
-    limit: int = Query(64, ge=1, le=64),
-    offset: int = Query(0, ge=0)
+    limit: int = Query(64, ge=1, le=64, description="cards per page, the cards of a set are ordered by card_id"),
+    offset: int = Query(0, ge=0),
+    cursor: str | None = Query(None, description="opaque next_cursor of the previous page. seeks past it instead of using offset"),
+    count: str = Query("exact", description="exact, estimate (query planner estimate) or none (skip the total)"),
+    fields: str | None = Query(None, description="comma separated fields of each card to return, e.g. card_id,name,images"),
+    exclude: str | None = Query(None, description="comma separated fields of each card to leave out, e.g. card_sets,card_prices")
 ) -> JSONResponse:
-    cur: Cursor = depends.cursor()
-    return sets_service.fetch_set_cards(
+    cur: AsyncCursor = depends.cursor()
+    return await sets_service.fetch_set_cards(
         cur,
         set_name,
         card_set_id,
@@ -53,5 +61,9 @@ async def get_card_sets(
         order_by,
         sort_order,
         limit,
-        offset 
+        offset,
+        cursor,
+        count,
+        fields,
+        exclude
     )
@@ -1,7 +1,7 @@
 from src.services.trivias_service import fetch_trivias
 from src.schemas.pagination import TriviaPagination
 from fastapi import APIRouter, Depends, Query
-from psycopg import Cursor
+from psycopg import AsyncCursor
 from src.core import db
 
 
@@ -13,12 +13,16 @@ async def get_trivias(
     depends = Depends(db.get_db),
     sort_by: str = Query("trivia_id", description='order by trivia_id or random'),
     limit: int = Query(64, ge=1, le=999),
-    offset: int = Query(0, ge=0)
+    offset: int = Query(0, ge=0),
+    count: str = Query("exact", description="exact, estimate (query planner estimate) or none (skip the total)"),
+    seed: int | None = Query(None, description="with sort_by=random, pages of the same seed come from one stable shuffle and never overlap")
 ):
-    cur: Cursor = depends.cursor()
-    return fetch_trivias(
+    cur: AsyncCursor = depends.cursor()
+    return await fetch_trivias(
         cur, 
         sort_by,
         limit,
-        offset
+        offset,
+        count,
+        seed
     )
\ No newline at end of file
@@ -1,23 +1,31 @@
 from abc import ABC, abstractmethod
-from botocore.config import Config
 from dotenv import load_dotenv
 from pathlib import Path
 from src import util
-import boto3
 import os
 
 
 load_dotenv()
 
 
-S3 = boto3.client(
-    service_name="s3",
-    endpoint_url=f"https://{os.getenv("R2_ACCOUNT_ID")}.r2.cloudflarestorage.com",
-    aws_access_key_id=os.getenv("R2_ACCESS_KEY_ID"),
-    aws_secret_access_key=os.getenv("R2_SECRET_ACCESS_KEY"),
-    config=Config(signature_version="s3v4"),
-    region_name="enam"
-)
+S3 = None
+
+
+def get_s3():
+    """The shared client, built on first use so importing this module stays cheap."""
+    global S3
+    if S3 is None:
+        import boto3
+        from botocore.config import Config
+        S3 = boto3.client(
+            service_name="s3",
+            endpoint_url=f"https://{os.getenv("R2_ACCOUNT_ID")}.r2.cloudflarestorage.com",
+            aws_access_key_id=os.getenv("R2_ACCESS_KEY_ID"),
+            aws_secret_access_key=os.getenv("R2_SECRET_ACCESS_KEY"),
+            config=Config(signature_version="s3v4"),
+            region_name="enam"
+        )
+    return S3
 
 
 class S3Exception(Exception):
@@ -32,7 +40,7 @@ class S3Client(ABC):
     def __init__(self, prefix: str, bucket: str):
         self.__bucket = bucket
         self.__prefix = prefix
-        self.__s3 = S3    
+        self.__s3 = get_s3()
 
     def upload(self, file: Path, name: str) -> str | None:
         if not file.exists() or not file.is_file():
@@ -53,12 +61,12 @@ class S3Client(ABC):
                     delete_us["Objects"].append({"Key": obj["Key"]})
                 
                 if len(delete_us["Objects"]) >= 1000:
-                    S3.delete_objects(Bucket=self.__bucket, Delete=delete_us)
+                    self.__s3.delete_objects(Bucket=self.__bucket, Delete=delete_us)
                     print(f"[DELETED] [{len(delete_us['Objects'])}]")
                     delete_us = dict(Objects=[])
         
         if delete_us["Objects"]:
-            S3.delete_objects(Bucket=self.__bucket, Delete=delete_us)
+            self.__s3.delete_objects(Bucket=self.__bucket, Delete=delete_us)
             print(f"[DELETED] [{len(delete_us['Objects'])}]")
 
     def close(self) -> None:
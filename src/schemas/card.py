@@ -4,7 +4,7 @@ from src.schemas.card_set import CardSet
 from src.schemas.banlist import Banlist
 from src.schemas.image import Image
 from typing import Optional, List
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class Card(BaseModel):
@@ -43,4 +43,12 @@ class CardCreate(BaseModel):
     attribute: Optional[str] = None
     frametype: str
     race: Optional[str] = None
-    type: Optional[str] = None
\ No newline at end of file
+    type: Optional[str] = None
+
+
+MAX_BATCH_IDS = 5000
+
+
+class CardBatch(BaseModel):
+
+    card_ids: List[int] = Field(max_length=MAX_BATCH_IDS)
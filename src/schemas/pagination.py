@@ -2,34 +2,36 @@ from src.schemas.card_set import CardSet
 from src.schemas.trivia import Trivia
 from src.schemas.card import Card
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 
 class CardPagination(BaseModel):
     
-    total: int
+    total: Optional[int] = None
     limit: int
     offset: int
     page: int
-    pages: int
+    pages: Optional[int] = None
+    next_cursor: Optional[str] = None
     results: List[Card]
 
 
 class CardSetPagination(BaseModel):
     
-    total: int
+    total: Optional[int] = None
     limit: int
     offset: int
     page: int
-    pages: int
+    pages: Optional[int] = None
+    next_cursor: Optional[str] = None
     results: List[CardSet]
 
 
 class TriviaPagination(BaseModel):
     
-    total: int
+    total: Optional[int] = None
     limit: int
     offset: int
     page: int
-    pages: int
+    pages: Optional[int] = None
     results: List[Trivia]
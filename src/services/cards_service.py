@@ -1,43 +1,159 @@
-from fastapi.responses import JSONResponse, Response
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.exceptions import HTTPException
 from src.schemas.card import CardCreate
+from src.core.payload import EncodedPayload, encode_json, FastJSONResponse
+from src.core.catalog import CardCatalog
+from src.core.autocomplete import WORD_SEPARATORS, MAX_SUGGESTIONS
+from src.core import fulltext
+from typing import Iterator, AsyncIterator
+from collections.abc import Sequence
+from threading import Lock
+import asyncio
 from fastapi import status
-from psycopg import Cursor, Connection
+from psycopg import AsyncCursor, AsyncConnection
+from src.core import counts
+from src.core import cache
+from src.core import refresh
 from src.core import db
 from src import globals
 from src import util
 
 
-def fetch_all_cards(cur: Cursor) -> JSONResponse:
-    cards: list[dict] = []
+ALL_CARDS_PAYLOAD: tuple[int, EncodedPayload] | None = None
+ALL_CARDS_LOCK = Lock()
+# the rebuild of ALL_CARDS_PAYLOAD running in a thread
+ALL_CARDS_BUILD: asyncio.Task | None = None
+
+
+def get_all_cards_payload(cards: Sequence[dict], version: int | None = None) -> EncodedPayload:
+    """Blocking: encodes and compresses every card. Runs in the warm up and in the thread of get_all_cards_payload_async."""
+    global ALL_CARDS_PAYLOAD
+    if version is None:
+        version = globals.globals_get_data_version()
+    with ALL_CARDS_LOCK:
+        if ALL_CARDS_PAYLOAD is None or ALL_CARDS_PAYLOAD[0] != version:
+            ALL_CARDS_PAYLOAD = (version, EncodedPayload.from_chunks(all_cards_chunks(cards)))
+        return ALL_CARDS_PAYLOAD[1]
+
+
+def all_cards_chunks(cards: Sequence[dict], cards_per_chunk: int = 256) -> Iterator[bytes]:
+    """The all cards page encoded a few cards at a time, the same bytes encode_json gives for the whole page."""
+    total: int = len(cards)
+    head: bytes = encode_json({"total": total, "limit": total, "offset": 0, "page": 1, "pages": 1, "results": []})
+    # the page without its closing `]}`, the cards go in between
+    yield head[:-2]
+    chunk: list[bytes] = []
+    for i, card in enumerate(cards):
+        chunk.append(encode_json(card))
+        if len(chunk) == cards_per_chunk:
+            yield (b"," if i >= cards_per_chunk else b"") + b",".join(chunk)
+            chunk = []
+    if chunk:
+        yield (b"," if total > len(chunk) else b"") + b",".join(chunk)
+    yield b"]}"
+
+
+async def get_all_cards_payload_async(cards: Sequence[dict]) -> EncodedPayload:
+    """
+        Rebuilds a stale payload in a thread and keeps answering with the
+        previous one until the new one is ready. Only waits when there is
+        no payload at all.
+    """
+    global ALL_CARDS_BUILD
+    version: int = globals.globals_get_data_version()
+    current = ALL_CARDS_PAYLOAD
+    if current is not None and current[0] == version:
+        return current[1]
+    if ALL_CARDS_BUILD is None or ALL_CARDS_BUILD.done():
+        ALL_CARDS_BUILD = asyncio.create_task(asyncio.to_thread(get_all_cards_payload, cards, version))
+        ALL_CARDS_BUILD.add_done_callback(_all_cards_built)
+    if current is not None:
+        return current[1]
+    return await asyncio.shield(ALL_CARDS_BUILD)
+
+
+def _all_cards_built(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        print(f"[EXCEPTION get_all_cards_payload_async] | {task.exception()}")
+
+
+# CardCatalog.LAZY_INDEXES being built in a thread, by index name
+INDEX_BUILDS: dict[str, asyncio.Task] = {}
+
+
+def get_catalog_with(index: str) -> CardCatalog | None:
+    """
+        The catalog when its `index` is built. Otherwise the build starts in
+        a thread and None is returned, so the request is answered from the
+        database like when no catalog is loaded.
+    """
+    catalog: CardCatalog | None = globals.globals_get_catalog()
+    if catalog is None or getattr(catalog, index) is not None:
+        return catalog
+    task: asyncio.Task | None = INDEX_BUILDS.get(index)
+    if task is None or task.done():
+        INDEX_BUILDS[index] = asyncio.create_task(build_catalog_index(catalog, index))
+    return None
+
+
+async def build_catalog_index(catalog: CardCatalog, index: str) -> None:
+    try:
+        rows, live = catalog.index_rows()
+        built = await asyncio.to_thread(catalog.build_index, index, rows, live)
+        catalog.swap_in_index(index, built, rows, live)
+        print(f"[CATALOG INDEX] {index} | rows: {rows}")
+    except Exception as e:
+        print(f"[EXCEPTION build_catalog_index] | {index} | {e}")
+
+
+async def fetch_all_cards(
+    cur: AsyncCursor,
+    accept_encoding: str | None = None,
+    if_none_match: str | None = None,
+    fields: list[str] | None = None
+) -> Response:
+    cards: Sequence[dict] = []
     try:
         cards = globals.globals_get_cards()
     except Exception as e:
         print(e)
-        return JSONResponse('error', status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return FastJSONResponse('error', status.HTTP_500_INTERNAL_SERVER_ERROR)
     
     if not cards:
         try:
-            cur.execute("SELECT * FROM cards_mv;")
-            cards = cur.fetchall()
+            await cur.execute("SELECT * FROM cards_mv;")
+            cards = await cur.fetchall()
             globals.globals_set_cards(cards)
         except Exception as e:
             print(e)
-            return JSONResponse('error', status.HTTP_500_INTERNAL_SERVER_ERROR)
+            return FastJSONResponse('error', status.HTTP_500_INTERNAL_SERVER_ERROR)
     
-    response = {
-        "total": len(cards),
-        "limit": len(cards),
-        "offset": 0,
-        "page": 1,
-        "pages": 1,
-        "results": cards
-    }
-    return JSONResponse(response, status.HTTP_200_OK)
+    if fields is not None:
+        response = {
+            "total": len(cards),
+            "limit": len(cards),
+            "offset": 0,
+            "page": 1,
+            "pages": 1,
+            "results": util.project_cards(cards, fields)
+        }
+        return FastJSONResponse(response, status.HTTP_200_OK)
 
+    payload: EncodedPayload = await get_all_cards_payload_async(cards)
+    if payload.negotiate(accept_encoding) == "identity" and not payload.not_modified(if_none_match):
+        # inflating the uncompressed body (~60 ms) stays off the event loop
+        return await asyncio.to_thread(payload.response, accept_encoding, if_none_match)
+    return payload.response(accept_encoding, if_none_match)
 
-def fetch_card_by_id(cur: Cursor, card_id: int) -> JSONResponse:
-    card: dict | None = db.get_card_by_id(cur, card_id)
+
+async def fetch_card_by_id(cur: AsyncCursor, card_id: int, fields: list[str] | None = None) -> JSONResponse:
+    catalog: CardCatalog | None = globals.globals_get_catalog()
+    if catalog is not None:
+        card: dict | None = catalog.by_id.get(card_id)
+    else:
+        card = await db.get_card_by_id(cur, card_id)
+    if card is not None and fields is not None:
+        card = {col: card.get(col) for col in fields}
     response = {
         "total": 1 if card is not None else 0,
         "limit": 1,
@@ -47,11 +163,11 @@ def fetch_card_by_id(cur: Cursor, card_id: int) -> JSONResponse:
         "results": [card] if card is not None else []
     }
     http_status = status.HTTP_404_NOT_FOUND if card is None else status.HTTP_200_OK
-    return JSONResponse(response, http_status)
+    return FastJSONResponse(response, http_status)
 
 
-def fetch_cards_by_name(
-    cur: Cursor, 
+async def fetch_cards_by_name(
+    cur: AsyncCursor, 
     params: tuple[str], 
     where_clause: str, 
     search: str,
@@ -59,31 +175,54 @@ def fetch_cards_by_name(
     offset: int,
     sort_by: str,
     sort_order: str,
-    null_first: bool
+    null_first: bool,
+    after: tuple | None = None,
+    count: str = "exact",
+    columns: str = "*"
 ) -> JSONResponse:
     params.append(f"%{search}%")
-    try:
-        cur.execute(
-            f"""
-                SELECT 
-                    COUNT(*) as total 
-                FROM 
-                    cards_mv 
-                {where_clause}
-            """, 
-            tuple(params)
-        )
-    except Exception as e:
-        print(e)
-        return JSONResponse('error', status.HTTP_500_INTERNAL_SERVER_ERROR)
-    
-    total = cur.fetchone()['total']
+    return await _fetch_cards(
+        cur,
+        params,
+        where_clause,
+        limit,
+        offset,
+        sort_by,
+        sort_order,
+        null_first,
+        after,
+        count,
+        columns
+    )
+
 
-    # Pagination
+async def _fetch_cards(
+    cur: AsyncCursor,
+    params: tuple[str],
+    where_clause: str,
+    limit: int,
+    offset: int,
+    sort_by: str,
+    sort_order: str,
+    null_first: bool,
+    after: tuple | None = None,
+    count: str = "exact",
+    columns: str = "*"
+) -> JSONResponse:
+    key: tuple = counts.count_key("cards_mv", where_clause, params)
+    total: int | None = counts.cached_total(key, count)
+    # a page seeked by cursor only sees the rows after it, so it can't carry the total
+    windowed: bool = total is None and count == "exact" and after is None
+
+    if after is not None:
+        clause, clause_params = util.keyset_clause(sort_by, "card_id", sort_order, null_first, after)
+        where_clause = util.append_where(where_clause, clause)
+        params.extend(clause_params)
+        offset = 0
     params.extend([limit, offset])
     query = f"""
         SELECT 
-            *
+            {columns}{", COUNT(*) OVER() AS total_count" if windowed else ""}
         FROM 
             cards_mv
         {where_clause}
@@ -92,83 +231,309 @@ def fetch_cards_by_name(
         LIMIT %s 
         OFFSET %s;
     """
-    
+
     try:
-        cur.execute(query, tuple(params))
+        await cur.execute(query, tuple(params))
+        results: list[dict] = await cur.fetchall()
+        total = await counts.resolve_total(cur, key, count, results, windowed, offset, total)
     except Exception as e:
-        return JSONResponse('error', status.HTTP_500_INTERNAL_SERVER_ERROR)
+        print(e)
+        return FastJSONResponse('error', status.HTTP_500_INTERNAL_SERVER_ERROR)
     
     response = {
         "total": total,
         "limit": limit,
         "offset": offset,
         "page": (offset // limit) + 1,
-        "pages": (total + limit - 1) // limit,
-        "results": cur.fetchall()
+        "pages": util.count_pages(total, limit),
+        "next_cursor": util.next_cursor(results, limit, sort_by, sort_order, null_first, "card_id"),
+        "results": results
     }
 
-    return JSONResponse(response, status.HTTP_200_OK)
+    return FastJSONResponse(response, status.HTTP_200_OK)
 
 
-def _fetch_cards(
-    cur: Cursor,
-    params: tuple[str],
+async def fetch_ranked_cards(
+    cur: AsyncCursor,
+    params: list,
     where_clause: str,
+    relevance: str,
+    relevance_params: list,
     limit: int,
     offset: int,
-    sort_by: str,
-    sort_order: str,
-    null_first: bool
+    count: str = "exact",
+    columns: str = "*"
 ) -> JSONResponse:
+    """Cards matching `where_clause`, highest `relevance` expression first."""
+    key: tuple = counts.count_key("cards_mv", where_clause, params)
+    total: int | None = counts.cached_total(key, count)
+    windowed: bool = total is None and count == "exact"
+
     try:
-        cur.execute(
+        await cur.execute(
             f"""
                 SELECT 
-                    COUNT(*) as total 
+                    {columns},
+                    {relevance} AS relevance{", COUNT(*) OVER() AS total_count" if windowed else ""}
                 FROM 
                     cards_mv
-                {where_clause};
+                {where_clause}
+                ORDER BY 
+                    relevance DESC, name ASC, card_id ASC
+                LIMIT %s 
+                OFFSET %s;
             """,
-            tuple(params)
-        )            
+            (*relevance_params, *params, limit, offset)
+        )
+        results: list[dict] = await cur.fetchall()
+        total = await counts.resolve_total(cur, key, count, results, windowed, offset, total)
     except Exception as e:
         print(e)
-        return JSONResponse('error', status.HTTP_500_INTERNAL_SERVER_ERROR)
-    
-    total = cur.fetchone()['total']
-    params.extend([limit, offset])
-    query = f"""
-        SELECT 
-            * 
-        FROM 
-            cards_mv
-        {where_clause}
-        ORDER BY 
-            {sort_by} {sort_order} {"NULLS FIRST" if null_first else "NULLS LAST"}, card_id ASC
-        LIMIT %s 
-        OFFSET %s;
-    """
+        return FastJSONResponse('error', status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    for r in results:
+        del r['relevance']
+
+    response = {
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "page": (offset // limit) + 1,
+        "pages": util.count_pages(total, limit),
+        "results": results
+    }
+
+    return FastJSONResponse(response, status.HTTP_200_OK)
+
+
+async def fetch_similar_cards(
+    cur: AsyncCursor,
+    params: list,
+    where_clause: str,
+    search: str,
+    min_similarity: float,
+    limit: int,
+    offset: int,
+    count: str = "exact",
+    columns: str = "*"
+) -> JSONResponse:
+    # `name % term` can use idx_cards_mv_name_trgm, the similarity() check keeps the clause self-contained
+    where_clause = util.append_where(
+        where_clause,
+        "((name %% %s AND similarity(name, %s) >= %s) OR name ILIKE %s)"
+    )
+    params.extend([search, search, min_similarity, f"%{search}%"])
     try:
-        cur.execute(query, tuple(params))
+        await cur.execute(
+            "SELECT set_config('pg_trgm.similarity_threshold', %s, true);",
+            (str(min_similarity), )
+        )
     except Exception as e:
         print(e)
-        return JSONResponse('error', status.HTTP_500_INTERNAL_SERVER_ERROR)
-    
+        return FastJSONResponse('error', status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    return await fetch_ranked_cards(
+        cur, params, where_clause, "similarity(name, %s)", [search], limit, offset, count, columns
+    )
+
+
+def fetch_ranked_cards_from_catalog(
+    catalog: CardCatalog,
+    filters: dict[str, str],
+    search: str,
+    min_similarity: float,
+    limit: int,
+    offset: int,
+    fields: list[str] | None = None
+) -> JSONResponse:
+    total, cards = catalog.rank(filters, search, min_similarity, limit, offset)
+    cards = util.project_cards(cards, fields)
     response = {
         "total": total,
         "limit": limit,
         "offset": offset,
         "page": (offset // limit) + 1,
         "pages": (total + limit - 1) // limit,
-        "results": cur.fetchall()
+        "results": cards
     }
 
-    return JSONResponse(response, status.HTTP_200_OK)
+    return FastJSONResponse(response, status.HTTP_200_OK)
 
 
-def fetch_cards(
-    cur: Cursor,
+def fetch_text_ranked_cards_from_catalog(
+    catalog: CardCatalog,
+    filters: dict[str, str],
+    search: str | None,
+    text: str,
+    limit: int,
+    offset: int,
+    fields: list[str] | None = None
+) -> JSONResponse:
+    total, cards = catalog.rank_text(filters, search, text, limit, offset)
+    cards = util.project_cards(cards, fields)
+    response = {
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "page": (offset // limit) + 1,
+        "pages": (total + limit - 1) // limit,
+        "results": cards
+    }
+
+    return FastJSONResponse(response, status.HTTP_200_OK)
+
+
+def fetch_cards_from_catalog(
+    catalog: CardCatalog,
+    filters: dict[str, str],
+    search: str | None,
+    limit: int,
+    offset: int,
+    sort_by: str,
+    sort_order: str,
+    null_first: bool,
+    after: tuple | None = None,
+    text: str | None = None,
+    fields: list[str] | None = None
+) -> JSONResponse:
+    total, cards = catalog.query(filters, search, sort_by, sort_order, null_first, limit, offset, after, text)
+    cards = util.project_cards(cards, fields)
+    if after is not None:
+        offset = 0
+    response = {
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "page": (offset // limit) + 1,
+        "pages": (total + limit - 1) // limit,
+        "next_cursor": util.next_cursor(cards, limit, sort_by, sort_order, null_first, "card_id"),
+        "results": cards
+    }
+
+    return FastJSONResponse(response, status.HTTP_200_OK)
+
+
+def fetch_random_cards_from_catalog(
+    catalog: CardCatalog,
+    filters: dict[str, str],
+    search: str | None,
+    limit: int,
+    offset: int,
+    seed: int | None,
+    text: str | None = None,
+    fields: list[str] | None = None
+) -> JSONResponse:
+    total, cards = catalog.sample(filters, search, limit, offset, seed, text)
+    cards = util.project_cards(cards, fields)
+    response = {
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "page": (offset // limit) + 1,
+        "pages": (total + limit - 1) // limit,
+        "results": cards
+    }
+
+    return FastJSONResponse(response, status.HTTP_200_OK)
+
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "json": "application/json"
+}
+EXPORT_BATCH_SIZE = 256
+
+
+async def iter_cards_from_db(
+    params: list,
+    where_clause: str,
+    sort_by: str,
+    sort_order: str,
+    null_first: bool,
+    columns: str = "*"
+) -> AsyncIterator[dict]:
+    # the request connection is released before the body is streamed,
+    # so the server-side cursor needs a pooled connection of its own
+    async with db.POOL.connection() as conn:
+        async with conn.cursor(name="cards_export") as cur:
+            cur.itersize = EXPORT_BATCH_SIZE
+            await cur.execute(
+                f"""
+                    SELECT 
+                        {columns} 
+                    FROM 
+                        cards_mv
+                    {where_clause}
+                    ORDER BY 
+                        {sort_by} {sort_order} {"NULLS FIRST" if null_first else "NULLS LAST"}, card_id ASC;
+                """,
+                tuple(params)
+            )
+            async for card in cur:
+                yield card
+
+
+async def iter_cards_from_catalog(cards: Iterator[dict], fields: list[str] | None = None) -> AsyncIterator[dict]:
+    for card in cards:
+        yield card if fields is None else {col: card.get(col) for col in fields}
+
+
+def encode_export_chunk(batch: list[bytes], export: str, written: bool) -> bytes:
+    if export == "ndjson":
+        return b"\n".join(batch) + b"\n"
+    chunk = b",".join(batch)
+    return b"," + chunk if written else chunk
+
+
+async def encode_export(cards: AsyncIterator[dict], export: str) -> AsyncIterator[bytes]:
+    batch: list[bytes] = []
+    written = False
+    if export == "json":
+        yield b"["
+    async for card in cards:
+        batch.append(encode_json(card))
+        if len(batch) == EXPORT_BATCH_SIZE:
+            yield encode_export_chunk(batch, export, written)
+            batch, written = [], True
+    if batch:
+        yield encode_export_chunk(batch, export, written)
+    if export == "json":
+        yield b"]"
+
+
+def export_cards(
+    export: str,
+    filters: dict[str, str],
+    params: list,
+    where_clause: str,
+    search: str | None,
+    sort_by: str,
+    sort_order: str,
+    null_first: bool,
+    text: str | None = None,
+    fields: list[str] | None = None
+) -> Response:
+    if export not in EXPORT_MEDIA_TYPES:
+        return Response(content=f'invalid export -> {export}', status_code=status.HTTP_400_BAD_REQUEST)
+
+    catalog: CardCatalog | None = get_catalog_with("text_index") if text else globals.globals_get_catalog()
+    if catalog is not None and sort_by != "RANDOM()":
+        cards = iter_cards_from_catalog(
+            catalog.iter_rows(filters, search, sort_by, sort_order, null_first, text),
+            fields
+        )
+    else:
+        if search:
+            params.append(f"%{search}%")
+        cards = iter_cards_from_db(
+            params, where_clause, sort_by, sort_order, null_first, util.card_columns(fields)
+        )
+
+    return StreamingResponse(encode_export(cards, export), media_type=EXPORT_MEDIA_TYPES[export])
+
+
+async def fetch_cards(
+    cur: AsyncCursor,
     limit: int,
     offset: int,
     sort_by: str,
@@ -181,10 +546,103 @@ def fetch_cards(
     race: str | None,
     type: str | None,
     attribute: str | None,
-    frametype: str | None
+    frametype: str | None,
+    accept_encoding: str | None = None,
+    if_none_match: str | None = None,
+    export: str | None = None,
+    cursor: str | None = None,
+    count: str = "exact",
+    seed: int | None = None,
+    min_similarity: float = 0.3,
+    text: str | None = None,
+    fields: str | None = None,
+    exclude: str | None = None
 ) -> JSONResponse:
-    if all_cards:
-        return fetch_all_cards(cur)
+    # all_cards has its own payload cache, exports stream and unseeded random pages must differ
+    if all_cards or export is not None or (sort_by.lower() == "random" and seed is None):
+        key: tuple | None = None
+    else:
+        key = (
+            "cards",
+            limit,
+            offset,
+            util.normalize_card_sort_by(sort_by),
+            util.normalize_sort_order(sort_order, sort_by.lower() == "random"),
+            sort_by.lower() == "relevance",
+            card_id,
+            search,
+            text,
+            null_first,
+            tuple(sorted(util.extract_card_filter_values(locals()).items())),
+            cursor,
+            util.normalize_count_mode(count),
+            seed,
+            min_similarity,
+            tuple(util.extract_card_fields(fields, exclude) or ())
+        )
+
+    return await cache.cached_response(key, lambda: query_cards(
+        cur,
+        limit,
+        offset,
+        sort_by,
+        sort_order,
+        all_cards,
+        card_id,
+        search,
+        null_first,
+        archetype,
+        race,
+        type,
+        attribute,
+        frametype,
+        accept_encoding,
+        if_none_match,
+        export,
+        cursor,
+        count,
+        seed,
+        min_similarity,
+        text,
+        fields,
+        exclude
+    ))
+
+
+async def query_cards(
+    cur: AsyncCursor,
+    limit: int,
+    offset: int,
+    sort_by: str,
+    sort_order: str,
+    all_cards: bool,
+    card_id: int | None,
+    search: str | None,
+    null_first: bool,
+    archetype: str | None,
+    race: str | None,
+    type: str | None,
+    attribute: str | None,
+    frametype: str | None,
+    accept_encoding: str | None = None,
+    if_none_match: str | None = None,
+    export: str | None = None,
+    cursor: str | None = None,
+    count: str = "exact",
+    seed: int | None = None,
+    min_similarity: float = 0.3,
+    text: str | None = None,
+    fields: str | None = None,
+    exclude: str | None = None
+) -> JSONResponse:
+    fields_response: Response | None = util.is_valid_card_fields(fields, exclude)
+    if fields_response is not None:
+        return fields_response
+
+    if all_cards and export is None:
+        return await fetch_all_cards(
+            cur, accept_encoding, if_none_match, util.extract_card_fields(fields, exclude)
+        )
 
     enums_response: JSONResponse | None = util.is_valid_enums(
         archetype,
@@ -197,15 +655,122 @@ def fetch_cards(
     if enums_response is not None:
         return enums_response
     
+    if text is not None and not fulltext.parse_query(text):
+        return Response(content=f'text has no searchable words -> {text}', status_code=status.HTTP_400_BAD_REQUEST)
+
+    relevance: bool = bool(search or text) and sort_by.lower() == "relevance"
     sort_by = util.normalize_card_sort_by(sort_by)
     sort_order = util.normalize_sort_order(sort_order, sort_by.lower() == 'random')
     where_clause, params = util.extract_card_filters(locals(), search)
+    # the sort column stays in so next_cursor can be built from the page
+    projection: list[str] | None = util.extract_card_fields(fields, exclude, sort_by)
+    columns: str = util.card_columns(projection)
+
+    if export is not None:
+        return export_cards(
+            export.lower(),
+            util.extract_card_filter_values(locals()),
+            params,
+            where_clause,
+            search,
+            sort_by,
+            sort_order,
+            null_first,
+            text,
+            projection
+        )
 
     if card_id is not None:
-        return fetch_card_by_id(cur, card_id)
+        return await fetch_card_by_id(cur, card_id, projection)
+
+    after: tuple | None = None
+    if cursor is not None:
+        after = util.decode_cursor(cursor, sort_by, sort_order, null_first)
+        if after is None or sort_by == "RANDOM()" or relevance:
+            return Response(content=f'invalid cursor -> {cursor}', status_code=status.HTTP_400_BAD_REQUEST)
+
+    catalog: CardCatalog | None = get_catalog_with("text_index") if text else globals.globals_get_catalog()
+    if relevance and text:
+        if catalog is not None:
+            return fetch_text_ranked_cards_from_catalog(
+                catalog,
+                util.extract_card_filter_values(locals()),
+                search,
+                text,
+                limit,
+                offset,
+                projection
+            )
+        if search:
+            params.append(f"%{search}%")
+        return await fetch_ranked_cards(
+            cur,
+            params,
+            where_clause,
+            f"ts_rank({util.CARD_TEXT_VECTOR}, to_tsquery('english', %s))",
+            [fulltext.to_tsquery(fulltext.parse_query(text))],
+            limit,
+            offset,
+            util.normalize_count_mode(count),
+            columns
+        )
+
+    if relevance:
+        if catalog is not None:
+            return fetch_ranked_cards_from_catalog(
+                catalog,
+                util.extract_card_filter_values(locals()),
+                search,
+                min_similarity,
+                limit,
+                offset,
+                projection
+            )
+        where_clause, params = util.extract_card_filters(locals(), None)
+        return await fetch_similar_cards(
+            cur,
+            params,
+            where_clause,
+            search,
+            min_similarity,
+            limit,
+            offset,
+            util.normalize_count_mode(count),
+            columns
+        )
+
+    if catalog is not None and sort_by == "RANDOM()":
+        return fetch_random_cards_from_catalog(
+            catalog,
+            util.extract_card_filter_values(locals()),
+            search,
+            limit,
+            offset,
+            seed,
+            text,
+            projection
+        )
+
+    if sort_by == "RANDOM()" and seed is not None:
+        sort_by = util.seeded_random_order(seed)
+
+    if catalog is not None:
+        return fetch_cards_from_catalog(
+            catalog,
+            util.extract_card_filter_values(locals()),
+            search,
+            limit,
+            offset,
+            sort_by,
+            sort_order,
+            null_first,
+            after,
+            text,
+            projection
+        )
 
     if search:
-        return fetch_cards_by_name(
+        return await fetch_cards_by_name(
             cur, 
             params, 
             where_clause, 
@@ -214,10 +779,13 @@ def fetch_cards(
             offset, 
             sort_by, 
             sort_order, 
-            null_first
+            null_first,
+            after,
+            util.normalize_count_mode(count),
+            columns
         )
     
-    return _fetch_cards(
+    return await _fetch_cards(
         cur,
         params,
         where_clause,
@@ -225,13 +793,89 @@ def fetch_cards(
         offset,
         sort_by,
         sort_order,
-        null_first
+        null_first,
+        after,
+        util.normalize_count_mode(count),
+        columns
+    )
+
+
+async def hydrate_cards(cur: AsyncCursor, card_ids: list[int], projection: list[str] | None = None) -> dict[int, dict]:
+    """card_id -> projected card, from the catalog or one batch query. Unknown ids are left out."""
+    catalog: CardCatalog | None = globals.globals_get_catalog()
+    if catalog is not None:
+        found: list[dict] = [catalog.by_id[card_id] for card_id in card_ids if card_id in catalog.by_id]
+    else:
+        await cur.execute(
+            f"SELECT {util.card_columns(projection)} FROM cards_mv WHERE card_id = ANY(%s);",
+            (card_ids, )
+        )
+        found = await cur.fetchall()
+    return {card['card_id']: card for card in util.project_cards(found, projection)}
+
+
+async def fetch_cards_by_ids(
+    cur: AsyncCursor,
+    card_ids: list[int],
+    fields: str | None = None,
+    exclude: str | None = None
+) -> JSONResponse:
+    fields_response: Response | None = util.is_valid_card_fields(fields, exclude)
+    if fields_response is not None:
+        return fields_response
+    projection: list[str] | None = util.extract_card_fields(fields, exclude)
+
+    card_ids = list(dict.fromkeys(card_ids))
+    try:
+        found: dict[int, dict] = await hydrate_cards(cur, card_ids, projection)
+    except Exception as e:
+        print(e)
+        return FastJSONResponse('error', status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    results: list[dict] = [found[card_id] for card_id in card_ids if card_id in found]
+    response = {
+        "total": len(results),
+        "results": results,
+        "missing": [card_id for card_id in card_ids if card_id not in found]
+    }
+    return FastJSONResponse(response, status.HTTP_200_OK)
+
+
+async def fetch_autocomplete(cur: AsyncCursor, q: str, limit: int) -> JSONResponse:
+    catalog: CardCatalog | None = get_catalog_with("prefix_index")
+    if catalog is not None:
+        return FastJSONResponse({"results": catalog.prefix_index.suggest(q, limit)}, status.HTTP_200_OK)
+
+    prefix: str = q.strip()
+    if not prefix:
+        return FastJSONResponse({"results": []}, status.HTTP_200_OK)
+    # same matches and order as PrefixIndex: the start of the name or of any word, names starting with it first
+    escaped: str = util.escape_like(prefix)
+    await cur.execute(
+        """
+            SELECT 
+                card_id, 
+                name
+            FROM 
+                cards_mv
+            WHERE 
+                name ILIKE ANY(%s)
+            ORDER BY 
+                name ILIKE %s DESC, jsonb_array_length(card_sets) DESC, LENGTH(name) ASC, LOWER(name) COLLATE "C" ASC, card_id ASC
+            LIMIT %s;
+        """,
+        (
+            [f"{escaped}%"] + [f"%{separator}{escaped}%" for separator in WORD_SEPARATORS],
+            f"{escaped}%",
+            min(limit, MAX_SUGGESTIONS)
+        )
     )
+    return FastJSONResponse({"results": await cur.fetchall()}, status.HTTP_200_OK)
 
 
-def create_card_service(conn: Connection, cur: Cursor, card: CardCreate) -> Response | HTTPException:
-    cur.execute("SELECT card_id FROM cards WHERE card_id = %s;", (card.card_id, ))
-    r = cur.fetchone()
+async def create_card_service(conn: AsyncConnection, cur: AsyncCursor, card: CardCreate) -> Response | HTTPException:
+    await cur.execute("SELECT card_id FROM cards WHERE card_id = %s;", (card.card_id, ))
+    r = await cur.fetchone()
     if r is not None:
         return Response(status_code=status.HTTP_409_CONFLICT)
     
@@ -247,7 +891,7 @@ def create_card_service(conn: Connection, cur: Cursor, card: CardCreate) -> Resp
         return enums_response    
     
     try:
-        cur.execute(
+        await cur.execute(
             """
                 INSERT INTO cards (
                     card_id,
@@ -286,18 +930,32 @@ def create_card_service(conn: Connection, cur: Cursor, card: CardCreate) -> Resp
                 card.type
             )
         )
-        conn.commit()
+        # the insert trigger wrote the cards_mv row and bumped the version
+        version: dict = await db.get_data_version(cur)
+        await cur.execute("SELECT * FROM cards_mv WHERE card_id = %s;", (card.card_id, ))
+        row: dict | None = await cur.fetchone()
+        await conn.commit()
+
+        # the tag moves last, a request in between must not get the new tag with the old body
+        if row is not None:
+            globals.globals_upsert_card(row)
+        globals.globals_set_data_tag(version['version'], version['updated_at'])
+        refresh.schedule_view_refresh()
         return Response(status_code=status.HTTP_201_CREATED)
     except Exception as e:
-        conn.rollback()
+        await conn.rollback()
         print(f"[EXCEPTION create_card_service] |{e}")
         return HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-def delete_card_by_id(conn: Connection, cur: Cursor, card_id: int) -> Response | HTTPException:
+async def delete_card_by_id(conn: AsyncConnection, cur: AsyncCursor, card_id: int) -> Response | HTTPException:
     try:
-        cur.execute("DELETE FROM cards WHERE card_id = %s;", (card_id, ))
-        conn.commit()
+        await cur.execute("DELETE FROM cards WHERE card_id = %s;", (card_id, ))
+        version: dict = await db.get_data_version(cur)
+        await conn.commit()
+        globals.globals_remove_card(card_id)
+        globals.globals_set_data_tag(version['version'], version['updated_at'])
+        refresh.schedule_view_refresh("card_sets_mv")
         return Response(status_code=status.HTTP_204_NO_CONTENT)
     except Exception as e:
         print(f"[EXCEPTION delete_card] | {card_id} | {e}")
@@ -0,0 +1,49 @@
+from fastapi.responses import JSONResponse, Response
+from src.core.payload import FastJSONResponse
+from src.core.deck import DeckColumns, InvalidDeck, parse_ydk, DECK_SECTIONS
+from src.core.catalog import CardCatalog
+from fastapi import status
+from psycopg import AsyncCursor
+from src import globals
+from src import util
+
+
+async def check_ydk_deck(
+    cur: AsyncCursor,
+    ydk: str,
+    fields: str | None = None,
+    exclude: str | None = None
+) -> JSONResponse:
+    fields_response: Response | None = util.is_valid_card_fields(fields, exclude)
+    if fields_response is not None:
+        return fields_response
+
+    try:
+        sections: dict[str, list[int]] = parse_ydk(ydk)
+    except InvalidDeck as e:
+        return FastJSONResponse({"error": str(e)}, status.HTTP_400_BAD_REQUEST)
+
+    card_ids: list[int] = list(dict.fromkeys(
+        card_id for section in DECK_SECTIONS for card_id in sections[section]
+    ))
+    catalog: CardCatalog | None = globals.globals_get_catalog()
+    if catalog is not None:
+        columns: DeckColumns = catalog.deck_columns
+        cards: list[dict] = [catalog.by_id[card_id] for card_id in card_ids if card_id in catalog.by_id]
+    else:
+        try:
+            await cur.execute("SELECT * FROM cards_mv WHERE card_id = ANY(%s);", (card_ids, ))
+            cards = await cur.fetchall()
+        except Exception as e:
+            print(e)
+            return FastJSONResponse('error', status.HTTP_500_INTERNAL_SERVER_ERROR)
+        columns = DeckColumns(cards)
+        order: dict[int, int] = {card_id: i for i, card_id in enumerate(card_ids)}
+        cards.sort(key=lambda card: order[card['card_id']])
+
+    response = {
+        **sections,
+        **columns.analyze(sections),
+        "cards": util.project_cards(cards, util.extract_card_fields(fields, exclude))
+    }
+    return FastJSONResponse(response, status.HTTP_200_OK)
@@ -1,4 +1,5 @@
-from psycopg import Connection, Cursor
+from starlette.concurrency import run_in_threadpool
+from psycopg import AsyncConnection, AsyncCursor
 from src.schemas.image import ImageType
 from src.core import db
 from src.s3 import YgoS3
@@ -6,9 +7,9 @@ from pathlib import Path
 from src.util import delete_file
 
 
-def create_image_service(
-    conn: Connection,
-    cur: Cursor,
+async def create_image_service(
+    conn: AsyncConnection,
+    cur: AsyncCursor,
     card_id: int, 
     file: bytes, 
     type: ImageType
@@ -20,7 +21,7 @@ def create_image_service(
     with open(path, "wb") as img_file:
         img_file.write(file)
 
-    image_url: str = s3.upload_card(card_id, ImageType.to_string(type), path)
+    image_url: str = await run_in_threadpool(s3.upload_card, card_id, ImageType.to_string(type), path)
     delete_file(path)
 
     column = "image_url"
@@ -30,7 +31,7 @@ def create_image_service(
         column = "image_url_small"
     
     try:
-        cur.execute(
+        await cur.execute(
             f"""
                 INSERT INTO card_images (
                     card_id,
@@ -45,7 +46,7 @@ def create_image_service(
             """,
             (card_id, image_url)
         )
-        conn.commit()
+        await conn.commit()
     except Exception as e:
-        conn.rollback()
+        await conn.rollback()
         print(f"[EXCEPTION create_image_service] | {e}")
\ No newline at end of file
@@ -1,16 +1,31 @@
-from fastapi.responses import JSONResponse
-from psycopg import Cursor
+from fastapi.responses import JSONResponse, Response
+from src.core.payload import FastJSONResponse
+from psycopg import AsyncCursor
 from fastapi import status
+from src.core import counts
+from src.core import cache
+from src.services import cards_service
 from src import util
 
 
-def fetch_set_by_id(
-    cur: Cursor, 
+# ORDER BY in fetch_sets resolves tcg_date to the formatted output column
+SET_SORT_EXPRESSIONS = {
+    "set_name": "set_name",
+    "set_code": "set_code",
+    "num_of_cards": "num_of_cards",
+    "tcg_date": "COALESCE(TO_CHAR(tcg_date, 'YYYY-MM-DD'), '')"
+}
+# one row per card of each set, /sets/cards pages over these
+SET_CARDS_TABLE = "card_sets_mv CROSS JOIN LATERAL unnest(card_ids, card_copies) AS members(card_id, copies)"
+
+
+async def fetch_set_by_id(
+    cur: AsyncCursor, 
     card_set_id: int, 
     limit: int, 
     offset: int
 ) -> JSONResponse:
-    cur.execute(
+    await cur.execute(
         """
             SELECT 
                 card_set_id,
@@ -26,7 +41,7 @@ def fetch_set_by_id(
             """, 
         (card_set_id, )
     )
-    r: dict | None = cur.fetchone()
+    r: dict | None = await cur.fetchone()
     total = 1 if r is not None else 0
     response = {
         "total": total,
@@ -38,11 +53,11 @@ def fetch_set_by_id(
     }
 
     htttp_status = status.HTTP_200_OK if r is not None else status.HTTP_204_NO_CONTENT
-    return JSONResponse(response, htttp_status)
+    return FastJSONResponse(response, htttp_status)
 
 
-def fetch_set_by_code(cur: Cursor, set_code: str, limit: int, offset: int) -> JSONResponse:
-    cur.execute(
+async def fetch_set_by_code(cur: AsyncCursor, set_code: str, limit: int, offset: int) -> JSONResponse:
+    await cur.execute(
         """
             SELECT 
                 card_set_id,
@@ -58,7 +73,7 @@ def fetch_set_by_code(cur: Cursor, set_code: str, limit: int, offset: int) -> JS
             """, 
         (set_code, )
     )
-    r: dict | None = cur.fetchone()
+    r: dict | None = await cur.fetchone()
     total = 1 if r is not None else 0
     response = {
         "total": total,
@@ -70,42 +85,88 @@ def fetch_set_by_code(cur: Cursor, set_code: str, limit: int, offset: int) -> JS
     }
 
     htttp_status = status.HTTP_200_OK if r is not None else status.HTTP_204_NO_CONTENT
-    return JSONResponse(response, htttp_status)
+    return FastJSONResponse(response, htttp_status)
+
+
+async def fetch_sets(
+    cur: AsyncCursor,
+    search: str | None,
+    card_set_id: int | None,
+    set_code: str,
+    limit: int,
+    offset: int,
+    sort_by: str,
+    sort_order: str,
+    cursor: str | None = None,
+    count: str = "exact"
+) -> JSONResponse:
+    key = (
+        "sets",
+        search,
+        card_set_id,
+        set_code,
+        limit,
+        offset,
+        util.normalize_card_sets_sort_by(sort_by),
+        util.normalize_sort_order(sort_order),
+        cursor,
+        util.normalize_count_mode(count)
+    )
+    return await cache.cached_response(key, lambda: query_sets(
+        cur,
+        search,
+        card_set_id,
+        set_code,
+        limit,
+        offset,
+        sort_by,
+        sort_order,
+        cursor,
+        count
+    ))
 
 
-def fetch_sets(
-    cur: Cursor,
+async def query_sets(
+    cur: AsyncCursor,
     search: str | None,
     card_set_id: int | None,
     set_code: str,
     limit: int,
     offset: int,
     sort_by: str,
-    sort_order: str
+    sort_order: str,
+    cursor: str | None = None,
+    count: str = "exact"
 ) -> JSONResponse:
     
     if card_set_id:
-        return fetch_set_by_id(cur, card_set_id, limit, offset)
+        return await fetch_set_by_id(cur, card_set_id, limit, offset)
     
     if set_code is not None:
-        return fetch_set_by_code(cur, set_code, limit, offset)
+        return await fetch_set_by_code(cur, set_code, limit, offset)
 
     sort_order: str = util.normalize_sort_order(sort_order)
     sort_by: str = util.normalize_card_sets_sort_by(sort_by)
     where_clause = "WHERE set_name ILIKE %s" if search is not None else ''
+    params = [f"%{search}%"] if search is not None else []
+    count: str = util.normalize_count_mode(count)
+    key: tuple = counts.count_key("card_sets", where_clause, params)
+    total: int | None = counts.cached_total(key, count)
+    windowed: bool = total is None and count == "exact" and cursor is None
 
-    if search is not None:
-        params = [f"%{search}%", limit, offset]
-    else:
-        params = [limit, offset]
-    
-    cur.execute(
-        f"SELECT count(*) as total FROM card_sets {where_clause};",
-        (f"%{search}%", ) if search is not None else None
-    )
-    total = cur.fetchone()['total']
+    if cursor is not None:
+        after: tuple | None = util.decode_cursor(cursor, sort_by, sort_order, False)
+        if after is None:
+            return FastJSONResponse({"error": f"invalid cursor -> {cursor}"}, status.HTTP_400_BAD_REQUEST)
+        clause, clause_params = util.keyset_clause(
+            SET_SORT_EXPRESSIONS[sort_by], "card_set_id", sort_order, False, after
+        )
+        where_clause = util.append_where(where_clause, clause)
+        params.extend(clause_params)
+        offset = 0
+    params.extend([limit, offset])
     
-    cur.execute(
+    await cur.execute(
         f"""
             SELECT
                 card_set_id,
@@ -113,45 +174,106 @@ def fetch_sets(
                 set_code,
                 num_of_cards,
                 COALESCE(TO_CHAR(tcg_date, 'YYYY-MM-DD'), '') AS tcg_date,
-                set_image
+                set_image{", COUNT(*) OVER() AS total_count" if windowed else ""}
             FROM 
                 card_sets
             {where_clause}
             ORDER BY 
-                {sort_by} {sort_order}
+                {sort_by} {sort_order}, card_set_id ASC
             LIMIT %s
             OFFSET %s;
         """,
         tuple(params)
     )
 
+    results: list[dict] = await cur.fetchall()
+    total = await counts.resolve_total(cur, key, count, results, windowed, offset, total)
     response = {
         "total": total,
         "limit": limit,
         "offset": offset,
         "page": (offset // limit) + 1,
-        "pages": (total + limit - 1) // limit,
-        "results": cur.fetchall()
+        "pages": util.count_pages(total, limit),
+        "next_cursor": util.next_cursor(results, limit, sort_by, sort_order, False, "card_set_id"),
+        "results": results
     }
 
-    http_status = status.HTTP_204_NO_CONTENT if total == 0 else status.HTTP_200_OK
-    return JSONResponse(response, http_status)
+    empty: bool = total == 0 if total is not None else not results
+    http_status = status.HTTP_204_NO_CONTENT if empty else status.HTTP_200_OK
+    return FastJSONResponse(response, http_status)
 
 
 
-def fetch_set_cards(
-    cur: Cursor,
+async def fetch_set_cards(
+    cur: AsyncCursor,
     set_name: str | None,
     card_set_id: int | None,
     set_code: str | None,
     order_by,
     sort_order,
     limit: int,
-    offset: int
+    offset: int,
+    cursor: str | None = None,
+    count: str = "exact",
+    fields: str | None = None,
+    exclude: str | None = None
+) -> JSONResponse:
+    key = (
+        "set_cards",
+        set_name,
+        card_set_id,
+        set_code,
+        util.normalize_card_sets_sort_by(order_by),
+        util.normalize_sort_order(sort_order),
+        limit,
+        offset,
+        cursor,
+        util.normalize_count_mode(count),
+        tuple(util.extract_card_fields(fields, exclude) or ())
+    )
+    return await cache.cached_response(key, lambda: query_set_cards(
+        cur,
+        set_name,
+        card_set_id,
+        set_code,
+        order_by,
+        sort_order,
+        limit,
+        offset,
+        cursor,
+        count,
+        fields,
+        exclude
+    ))
+
+
+async def query_set_cards(
+    cur: AsyncCursor,
+    set_name: str | None,
+    card_set_id: int | None,
+    set_code: str | None,
+    order_by,
+    sort_order,
+    limit: int,
+    offset: int,
+    cursor: str | None = None,
+    count: str = "exact",
+    fields: str | None = None,
+    exclude: str | None = None
 ) -> JSONResponse:
     
     if set_name is None and set_code is None and card_set_id is None:
-        return JSONResponse({"error": "you need to provide the set you whant the cards"}, status.HTTP_400_BAD_REQUEST)
+        return FastJSONResponse({"error": "you need to provide the set you whant the cards"}, status.HTTP_400_BAD_REQUEST)
+
+    fields_response: Response | None = util.is_valid_card_fields(fields, exclude)
+    if fields_response is not None:
+        return fields_response
+    projection: list[str] | None = util.extract_card_fields(fields, exclude)
+
+    order_by: str = util.normalize_card_sets_sort_by(order_by)
+    sort_order: str = util.normalize_sort_order(sort_order)
+    # postgres default: NULLS LAST for ascending, NULLS FIRST for descending
+    null_first: bool = sort_order == "desc"
         
     params = []
     where_clause = ''
@@ -165,37 +287,74 @@ def fetch_set_cards(
 
     if set_code is not None:
         params.append(set_code)
-        where_clause = "WHERE set_code = %s;"
+        where_clause = "WHERE set_code = %s"
 
-    cur.execute(f"SELECT count(*) as total FROM card_sets_mv {where_clause};", tuple(params))
-    total = cur.fetchone()['total']
+    count: str = util.normalize_count_mode(count)
+    key: tuple = counts.count_key(SET_CARDS_TABLE, where_clause, params)
+    total: int | None = counts.cached_total(key, count)
+    windowed: bool = total is None and count == "exact" and cursor is None
 
+    if cursor is not None:
+        after: tuple | None = util.decode_cursor(cursor, order_by, sort_order, null_first, ids=2)
+        if after is None:
+            return FastJSONResponse({"error": f"invalid cursor -> {cursor}"}, status.HTTP_400_BAD_REQUEST)
+        value, last_set_id, last_card_id = after
+        # seek to the cursor's set itself, then past its card within that set
+        clause, clause_params = util.keyset_clause(order_by, "card_set_id", sort_order, null_first, (value, last_set_id - 1))
+        where_clause = util.append_where(where_clause, f"{clause} AND (card_set_id <> %s OR card_id > %s)")
+        params.extend([*clause_params, last_set_id, last_card_id])
+        offset = 0
     params.extend([limit, offset])
-    cur.execute(
+    await cur.execute(
         f"""
             SELECT 
-                *
+                card_set_id,
+                set_name,
+                set_code,
+                num_of_cards,
+                tcg_date,
+                set_image,
+                card_id,
+                copies{", COUNT(*) OVER() AS total_count" if windowed else ""}
             FROM 
-                card_sets_mv
+                {SET_CARDS_TABLE}
             {where_clause}
             ORDER BY
-                {order_by} {sort_order}, card_set_id
+                {order_by} {sort_order}, card_set_id ASC, card_id ASC
             LIMIT %s
             OFFSET %s;
         """,
         tuple(params)
     )
     
-    r = cur.fetchall()
+    r: list[dict] = await cur.fetchall()
+    total = await counts.resolve_total(cur, key, count, r, windowed, offset, total)
+    next_cursor: str | None = None
+    if len(r) == limit:
+        last: dict = r[-1]
+        next_cursor = util.encode_cursor(order_by, sort_order, null_first, last[order_by], last['card_set_id'], last['card_id'])
+
+    # only the cards of this page are hydrated, grouped back under their set
+    found: dict[int, dict] = await cards_service.hydrate_cards(cur, [row['card_id'] for row in r], projection)
+    results: list[dict] = []
+    for row in r:
+        card_id: int = row.pop('card_id')
+        copies: int | None = row.pop('copies')
+        if not results or results[-1]['card_set_id'] != row['card_set_id']:
+            results.append({**row, "cards": []})
+        if card_id in found:
+            results[-1]['cards'].append({"card": found[card_id], "copies": copies})
+
     response = {
         "total": total,
         "limit": limit,
         "offset": offset,
         "page": (offset // limit) + 1,
-        "pages": (total + limit - 1) // limit,
-        "results": r
+        "pages": util.count_pages(total, limit),
+        "next_cursor": next_cursor,
+        "results": results
     }
 
     http_status = status.HTTP_204_NO_CONTENT if len(r) == 0 else status.HTTP_200_OK
 
-    return JSONResponse(response, http_status)
\ No newline at end of file
+    return FastJSONResponse(response, http_status)
@@ -1,21 +1,63 @@
 from fastapi.responses import JSONResponse
+from src.core.payload import FastJSONResponse
+from src.core.sampling import sample_page
 from fastapi import status
-from psycopg import Cursor
-from src.core import db
+from psycopg import AsyncCursor
+from src.core import counts
+from src import globals
+from src import util
 
 
-def fetch_trivias(
-    cur: Cursor,
+# ((data version, data tag), ids of the trivias that have answers, ascending)
+TRIVIA_IDS: tuple[tuple[int, str], list[int]] | None = None
+
+
+async def get_trivia_ids(cur: AsyncCursor) -> list[int]:
+    global TRIVIA_IDS
+    version: tuple[int, str] = (globals.globals_get_data_version(), globals.globals_get_data_tag())
+    if TRIVIA_IDS is None or TRIVIA_IDS[0] != version:
+        await cur.execute(
+            """
+                SELECT 
+                    t.trivia_id
+                FROM 
+                    trivias t
+                WHERE 
+                    EXISTS (SELECT 1 FROM trivia_answers ta WHERE ta.trivia_id = t.trivia_id)
+                ORDER BY 
+                    t.trivia_id;
+            """
+        )
+        TRIVIA_IDS = (version, [r['trivia_id'] for r in await cur.fetchall()])
+    return TRIVIA_IDS[1]
+
+
+async def fetch_trivias(
+    cur: AsyncCursor,
     sort_by: str,
     limit: int,
-    offset: int
+    offset: int,
+    count: str = "exact",
+    seed: int | None = None
 ) -> JSONResponse:
-    total = db.db_count(cur, 'trivias')
-    sort_by = "RANDOM()" if sort_by.lower() == 'random' else 't.trivia_id'
+    total: int | None = await counts.count_rows(cur, 'trivias', '', (), util.normalize_count_mode(count))
+    is_random: bool = sort_by.lower() == 'random'
+
+    if is_random:
+        # sample ids in memory instead of sorting the whole table by RANDOM()
+        trivia_ids: list[int] = sample_page(await get_trivia_ids(cur), limit, offset, seed)
+        where_clause = "WHERE t.trivia_id = ANY(%s)"
+        pagination = ''
+        params = (trivia_ids, )
+    else:
+        where_clause = ''
+        pagination = "ORDER BY t.trivia_id LIMIT %s OFFSET %s"
+        params = (limit, offset)
 
-    cur.execute(
+    await cur.execute(
         f"""
             SELECT
+                t.trivia_id,
                 t.question,
                 t.explanation,
                 t.source,
@@ -25,23 +67,28 @@ def fetch_trivias(
                 trivias t
             JOIN 
                 trivia_answers ta ON t.trivia_id = ta.trivia_id
+            {where_clause}
             GROUP BY 
                 t.trivia_id, t.question, t.explanation, t.source
-            ORDER BY
-                {sort_by}
-            LIMIT %s
-            OFFSET %s;
+            {pagination};
         """,
-        (limit, offset)
+        params
     )
 
+    results: list[dict] = await cur.fetchall()
+    if is_random:
+        position = {trivia_id: i for i, trivia_id in enumerate(trivia_ids)}
+        results.sort(key=lambda r: position[r['trivia_id']])
+    for r in results:
+        del r['trivia_id']
+
     response = {
         "total": total,
         "limit": limit,
         "offset": offset,
         "page": (offset // limit) + 1,
-        "pages": (total + limit - 1) // limit,
-        "results": cur.fetchall()
+        "pages": util.count_pages(total, limit),
+        "results": results
     }
 
-    return JSONResponse(response, status.HTTP_200_OK)
\ No newline at end of file
+    return FastJSONResponse(response, status.HTTP_200_OK)
@@ -2,9 +2,9 @@ from fastapi.responses import JSONResponse, Response
 from fastapi.exceptions import HTTPException
 from fastapi import status
 from pathlib import Path
+from src.core import fulltext
 from src import globals
-from PIL import Image
-import requests
+import base64
 import uuid
 import json
 import os
@@ -13,6 +13,7 @@ import os
 VALID_SORT_COLUMNS = {"name", "attack", "defence", "level", "card_id"}
 VALID_CARD_SETS_SORT_COLUMNS = {"set_name", "set_code", "num_of_cards", "tcg_date"}
 VALID_SORT_ORDERS = {"asc", "desc"}
+VALID_COUNT_MODES = {"exact", "estimate", "none"}
 FILTERABLE_COLUMNS = {
     "archetype",
     "race",
@@ -20,6 +21,31 @@ FILTERABLE_COLUMNS = {
     "attribute",
     "frametype",
 }
+# columns of cards_mv, in order
+CARD_FIELDS = (
+    "card_id",
+    "name",
+    "descr",
+    "pend_descr",
+    "monster_descr",
+    "attack",
+    "defence",
+    "level",
+    "archetype",
+    "attribute",
+    "frametype",
+    "race",
+    "type",
+    "card_sets",
+    "linkmarkers",
+    "banlists",
+    "images",
+    "card_prices"
+)
+# must match the expression of idx_cards_mv_text so the planner uses the index
+CARD_TEXT_VECTOR = (
+    "to_tsvector('english', COALESCE(descr, '') || ' ' || COALESCE(pend_descr, '') || ' ' || COALESCE(monster_descr, ''))"
+)
 
 
 def convert_to_webp(
@@ -29,6 +55,8 @@ def convert_to_webp(
 ) -> Path:
     if output is None: output = path.with_suffix(".webp")
     if force_compress or path.suffix != ".webp":
+        # Pillow is only needed to write images, the api workers never import it
+        from PIL import Image
         try:
             with Image.open(path) as img:
                 img.save(output, format='WEBP')
@@ -44,6 +72,7 @@ def convert_to_webp(
 def download_image(path: Path, url: str) -> Path:
     if isinstance(path, str):
         path = Path(path)
+    import requests
     r = requests.get(url, stream=True)    
     with open(path, "wb") as file:
         for chunk in r.iter_content(1024):
@@ -67,6 +96,11 @@ def normalize_card_sort_by(sort_by: str) -> str:
     return sort_by
 
 
+def seeded_random_order(seed: int, id_column: str = "card_id") -> str:
+    """ORDER BY expression giving a stable shuffle per seed, unlike RANDOM()."""
+    return f"md5({id_column}::text || '{int(seed)}')"
+
+
 def normalize_card_sets_sort_by(sort_by: str) -> str:
     sort_by = sort_by.lower()
     if sort_by not in VALID_CARD_SETS_SORT_COLUMNS:
@@ -82,17 +116,42 @@ def normalize_sort_order(sort_order: str, is_random: bool = False) -> str:
     return sort_order
 
 
-def extract_card_filters(locals: dict, search: str | None) -> str:
-    filters = []
-    params = []
+def normalize_count_mode(count: str) -> str:
+    count = count.lower()
+    if count not in VALID_COUNT_MODES:
+        count = "exact"
+    return count
+
+
+def count_pages(total: int | None, limit: int) -> int | None:
+    if total is None:
+        return None
+    return (total + limit - 1) // limit
 
+
+def extract_card_filter_values(locals: dict) -> dict[str, str]:
+    values = {}
     for col in FILTERABLE_COLUMNS:
         value: str = locals.get(col)
         if col == 'attribute' and value is not None:
             value = value.upper()
         if value is not None:
-            filters.append(f"{col} = %s")
-            params.append(value)
+            values[col] = value
+    return values
+
+
+def extract_card_filters(locals: dict, search: str | None) -> str:
+    filters = []
+    params = []
+
+    for col, value in extract_card_filter_values(locals).items():
+        filters.append(f"{col} = %s")
+        params.append(value)
+
+    text: str | None = locals.get('text')
+    if text:
+        filters.append(f"{CARD_TEXT_VECTOR} @@ to_tsquery('english', %s)")
+        params.append(fulltext.to_tsquery(fulltext.parse_query(text)))
     
     where_clause = f"WHERE {' AND '.join(filters)}" if filters else ''
     if search:
@@ -104,9 +163,114 @@ def extract_card_filters(locals: dict, search: str | None) -> str:
     return where_clause, params
 
 
+def split_fields(fields: str | None) -> list[str]:
+    return [f.strip().lower() for f in fields.split(",") if f.strip()] if fields else []
+
+
+def is_valid_card_fields(fields: str | None, exclude: str | None) -> Response | None:
+    for field in split_fields(fields) + split_fields(exclude):
+        if field not in CARD_FIELDS:
+            return Response(content=f'invalid field -> {field}', status_code=status.HTTP_400_BAD_REQUEST)
+
+
+def extract_card_fields(fields: str | None, exclude: str | None, *required: str) -> list[str] | None:
+    """cards_mv columns to read and return, None for all of them. `required` columns are always kept."""
+    if not fields and not exclude:
+        return None
+    wanted = set(split_fields(fields) or CARD_FIELDS) - set(split_fields(exclude))
+    wanted.update(col for col in ("card_id", *required) if col in CARD_FIELDS)
+    return [col for col in CARD_FIELDS if col in wanted]
+
+
+def card_columns(fields: list[str] | None) -> str:
+    return ", ".join(fields) if fields is not None else "*"
+
+
+def project_cards(cards: list[dict], fields: list[str] | None) -> list[dict]:
+    if fields is None:
+        return cards
+    return [{col: card.get(col) for col in fields} for card in cards]
+
+
+def encode_cursor(sort_by: str, sort_order: str, null_first: bool, value, *last_ids: int) -> str:
+    payload = json.dumps([sort_by, sort_order, null_first, value, *last_ids], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: str, sort_order: str, null_first: bool, ids: int = 1) -> tuple | None:
+    """
+        Returns the (sort value, id) the cursor points after, or None if it is invalid for this query.
+        Cursors over nested rows carry `ids` ids, outermost first.
+    """
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort_by, cursor_sort_order, cursor_null_first, value, *last_ids = json.loads(payload)
+    except Exception:
+        return None
+    if (cursor_sort_by, cursor_sort_order, cursor_null_first) != (sort_by, sort_order, null_first):
+        return None
+    if len(last_ids) != ids or not all(isinstance(last_id, int) for last_id in last_ids):
+        return None
+    if not (value is None or isinstance(value, (int, str))):
+        return None
+    return value, *last_ids
+
+
+def next_cursor(
+    results: list[dict],
+    limit: int,
+    sort_by: str,
+    sort_order: str,
+    null_first: bool,
+    id_column: str
+) -> str | None:
+    if len(results) < limit or sort_by not in results[-1]:
+        # random orders have no sort value to seek past
+        return None
+    last: dict = results[-1]
+    return encode_cursor(sort_by, sort_order, null_first, last[sort_by], last[id_column])
+
+
+def keyset_clause(
+    column: str,
+    id_column: str,
+    sort_order: str,
+    null_first: bool,
+    after: tuple
+) -> tuple[str, list]:
+    """
+        Predicate selecting the rows that come after `after` in
+        ORDER BY column sort_order NULLS FIRST/LAST, id_column ASC
+    """
+    value, last_id = after
+    if value is None:
+        clause = f"({column} IS NULL AND {id_column} > %s)"
+        if null_first:
+            clause = f"({clause} OR {column} IS NOT NULL)"
+        return clause, [last_id]
+
+    op = "<" if sort_order == "desc" else ">"
+    clause = f"{column} {op} %s OR ({column} = %s AND {id_column} > %s)"
+    if not null_first:
+        clause += f" OR {column} IS NULL"
+    return f"({clause})", [value, value, last_id]
+
+
+def escape_like(value: str) -> str:
+    """`value` matched literally by LIKE/ILIKE, whose default escape character is a backslash."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def append_where(where_clause: str, condition: str) -> str:
+    if where_clause == '':
+        return f"WHERE {condition}"
+    return f"{where_clause} AND {condition}"
+
+
 def load_ygoprodeck_data() -> None:
     Path("tmp").mkdir(exist_ok=True)
     print(f"[REQUESTING YGO DATA]")
+    import requests
     r = requests.get("https://db.ygoprodeck.com/api/v7/cardinfo.php")
     data = r.json()['data']
     with open(f"tmp/cards.json", "w+") as file:
@@ -117,6 +281,7 @@ def load_ygoprodeck_data() -> None:
 def load_ygoprodeck_cardsets() -> None:
     Path("tmp").mkdir(exist_ok=True)
     print(f"[REQUESTING YGO CARD SET DATA]")
+    import requests
     r = requests.get("https://db.ygoprodeck.com/api/v7/cardsets.php")
     data = r.json()
     with open(f"tmp/cardsets.json", "w+") as file: